@@ -1,141 +1,105 @@
 import os
-import json
-import sqlite3
-import tkinter as tk
-from tkinter import filedialog, ttk
-from datetime import datetime, timedelta
-import re
-
-DB_FILE = "inventory.db"
-
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS inventories (
-            character TEXT,
-            timestamp TEXT,
-            item_name TEXT,
-            quantity INTEGER,
-            rarity TEXT,
-            value INTEGER,
-            PRIMARY KEY (character, timestamp, item_name)
-        )
-    ''')
-    # Try to add missing columns if upgrading an older DB
-    try:
-        cursor.execute("ALTER TABLE inventories ADD COLUMN rarity TEXT")
-    except sqlite3.OperationalError:
-        pass
-    try:
-        cursor.execute("ALTER TABLE inventories ADD COLUMN value INTEGER")
-    except sqlite3.OperationalError:
-        pass
-    conn.commit()
-    return conn
-
-def parse_timestamp(ts_str):
-    try:
-        return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%SZ")
-    except ValueError:
-        return None
-
-def parse_filename_date(filename):
-    match = re.search(r'(\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}Z)', filename)
-    if match:
-        date_str = match.group(1)
-        try:
-            return datetime.strptime(date_str, "%Y-%m-%d-%H-%M-%SZ")
-        except ValueError:
-            return None
-    return None
-
-def load_json_files(folder, conn):
-    cursor = conn.cursor()
-    for filename in os.listdir(folder):
-        if filename.endswith(".json") and "_items_" in filename:
-            filepath = os.path.join(folder, filename)
-            with open(filepath, 'r') as f:
-                try:
-                    data = json.load(f)
-                    character = data.get("Character")
-                    timestamp = data.get("Timestamp")
-                    if character and timestamp:
-                        cursor.execute("SELECT COUNT(*) FROM inventories WHERE character=? AND timestamp=?", (character, timestamp))
-                        if cursor.fetchone()[0] > 0:
-                            continue
-                        item_dict = {}
-                        for item in data.get("Items", []):
-                            name = item.get("Name")
-                            stack = item.get("StackSize", 1)
-                            rarity = item.get("Rarity")
-                            value = item.get("Value")
-                            if name:
-                                if name not in item_dict:
-                                    item_dict[name] = {"qty": 0, "rarity": rarity, "value": value}
-                                item_dict[name]["qty"] += stack
-                        for name, info in item_dict.items():
-                            cursor.execute(
-                                "INSERT OR REPLACE INTO inventories VALUES (?, ?, ?, ?, ?, ?)",
-                                (character, timestamp, name, info["qty"], info["rarity"], info["value"])
-                            )
-                        conn.commit()
-                except json.JSONDecodeError:
-                    pass
-
-def get_characters(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT character FROM inventories ORDER BY character")
-    return [row[0] for row in cursor.fetchall()]
-
-def get_timestamps_for_char(conn, char):
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT timestamp FROM inventories WHERE character=? ORDER BY timestamp DESC", (char,))
-    return [row[0] for row in cursor.fetchall()]
-
-def get_latest_file_for_char(folder, char):
-    latest_file = None
-    latest_date = None
-    for filename in os.listdir(folder):
-        if filename.startswith(f"{char}_items_") and filename.endswith(".json"):
-            file_date = parse_filename_date(filename)
-            if file_date and (not latest_date or file_date > latest_date):
-                latest_date = file_date
-                latest_file = os.path.join(folder, filename)
-    return latest_file
-
-def load_latest_if_new(folder, conn, char):
-    latest_file = get_latest_file_for_char(folder, char)
-    if latest_file:
-        with open(latest_file, 'r') as f:
-            data = json.load(f)
-            timestamp = data.get("Timestamp")
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM inventories WHERE character=? AND timestamp=?", (char, timestamp))
-            if cursor.fetchone()[0] == 0:
-                item_dict = {}
-                for item in data.get("Items", []):
-                    name = item.get("Name")
-                    stack = item.get("StackSize", 1)
-                    rarity = item.get("Rarity")
-                    value = item.get("Value")
-                    if name:
-                        if name not in item_dict:
-                            item_dict[name] = {"qty": 0, "rarity": rarity, "value": value}
-                        item_dict[name]["qty"] += stack
-                for name, info in item_dict.items():
-                    cursor.execute(
-                        "INSERT OR REPLACE INTO inventories VALUES (?, ?, ?, ?, ?, ?)",
-                        (char, timestamp, name, info["qty"], info["rarity"], info["value"])
-                    )
-                conn.commit()
-                return timestamp
-    return None
-
-def get_items_at_timestamp(conn, char, ts):
-    cursor = conn.cursor()
-    cursor.execute("SELECT item_name, quantity FROM inventories WHERE character=? AND timestamp=?", (char, ts))
-    return {row[0]: row[1] for row in cursor.fetchall()}
+import time
+import threading
+import queue
+
+# Bulk-import workers started with spawn (Windows, macOS) re-run this file as
+# __mp_main__; they only need ItemCompareCore, so they skip loading Tk
+if __name__ != "__mp_main__":
+    import tkinter as tk
+    from tkinter import filedialog, ttk
+
+from ItemCompareCore import (
+    init_db, load_json_files, get_characters, get_timestamps_for_char, get_later_timestamps,
+    parse_timestamp, get_summary, compare_job, snapshot_cache, snapshot_index,
+    Timing, setup_logging, run_profiled, PROFILE_ENV,
+)
+
+FILTER_DEBOUNCE_MS = 200
+ROW_HEIGHT = 25
+
+# Sort By choices and column headers, as (DiffModel key, reverse)
+SORT_MODES = {
+    "Name": ("name", False),
+    "Change": ("abs_delta", True),
+    "Gain/Loss": ("delta", True),
+    "Value": ("value", True),
+}
+COLUMN_SORT_KEYS = {"Item": "name", "Change": "delta", "Value": "value"}
+
+class DiffModel:
+    # Diff rows held column-wise with precomputed sort keys. Each ordering is a list
+    # of row indices, computed on first use and reused for later sorts and filters.
+    def __init__(self, changes, item_meta):
+        self.names = list(changes)
+        self.deltas = [changes[name] for name in self.names]
+        self.values = []
+        for name, delta in zip(self.names, self.deltas):
+            unit_value = item_meta.get(name, (None, None))[1]
+            self.values.append(unit_value * delta if unit_value is not None else None)
+        self.lower_names = [name.lower() for name in self.names]
+        self.keys = {
+            "name": self.names,
+            "delta": self.deltas,
+            "abs_delta": [abs(delta) for delta in self.deltas],
+            "value": [value if value is not None else 0 for value in self.values],
+        }
+        self.orderings = {}
+
+    def ordering(self, key, reverse=False):
+        if (key, reverse) not in self.orderings:
+            self.orderings[(key, reverse)] = sorted(range(len(self.names)), key=self.keys[key].__getitem__, reverse=reverse)
+        return self.orderings[(key, reverse)]
+
+    def rows(self, key, reverse=False, view="Both", filter_text=""):
+        order = self.ordering(key, reverse)
+        deltas = self.deltas
+        if view == "Gained":
+            order = [i for i in order if deltas[i] > 0]
+        elif view == "Lost":
+            order = [i for i in order if deltas[i] < 0]
+        if filter_text:
+            lower_names = self.lower_names
+            order = [i for i in order if filter_text in lower_names[i]]
+        return order
+
+class DbWorker(threading.Thread):
+    # Runs database and filesystem jobs off the Tk thread on its own SQLite connection.
+    # Jobs are callables taking that connection; their results, and anything else
+    # posted, are queued for App.poll_worker to run on the Tk thread. A job that
+    # raises goes to its own error callback if it has one, otherwise to on_error.
+    def __init__(self, on_error):
+        super().__init__(daemon=True)
+        self.jobs = queue.Queue()
+        self.ui_queue = queue.Queue()
+        self.on_error = on_error
+
+    def submit(self, job, callback, on_error=None):
+        self.jobs.put((job, callback, on_error))
+
+    def post(self, fn, *args):
+        self.ui_queue.put((fn, args))
+
+    def stop(self):
+        self.jobs.put((None, None, None))
+
+    def run(self):
+        run_profiled(self.serve, ".worker")
+
+    def serve(self):
+        conn = init_db()
+        while True:
+            job, callback, on_error = self.jobs.get()
+            if job is None:
+                break
+            try:
+                result = job(conn)
+            except Exception as e:
+                conn.rollback()
+                snapshot_index.rollback()
+                self.post(on_error or self.on_error, e)
+            else:
+                self.post(callback, result)
 
 class App:
     def __init__(self, root):
@@ -151,7 +115,15 @@ class App:
         tk.Entry(left_frame, textvariable=self.folder, width=50).grid(row=0, column=1, pady=1)
         tk.Button(left_frame, text="Browse", command=self.browse_folder).grid(row=0, column=2, pady=1)
 
-        tk.Button(left_frame, text="Load Data", command=self.load_data).grid(row=1, column=0, columnspan=3, pady=1)
+        tk.Button(left_frame, text="Load Data", command=self.load_data).grid(row=1, column=0, pady=1)
+
+        bulk_frame = tk.Frame(left_frame)
+        bulk_frame.grid(row=1, column=1, columnspan=2, sticky="w", pady=1)
+        self.bulk_import = tk.BooleanVar(value=False)
+        tk.Checkbutton(bulk_frame, text="Bulk import", variable=self.bulk_import).pack(side="left")
+        tk.Label(bulk_frame, text="Workers:").pack(side="left")
+        self.workers = tk.IntVar(value=os.cpu_count() or 1)
+        tk.Spinbox(bulk_frame, from_=1, to=64, width=4, textvariable=self.workers).pack(side="left")
 
         tk.Label(left_frame, text="Character:").grid(row=2, column=0, sticky="w", pady=1)
         self.char_combo = ttk.Combobox(left_frame)
@@ -175,7 +147,7 @@ class App:
         tk.Label(left_frame, text="Filter:").grid(row=7, column=0, sticky="w", pady=1)
         self.filter_entry = tk.Entry(left_frame)
         self.filter_entry.grid(row=7, column=1, pady=1)
-        self.filter_entry.bind("<KeyRelease>", self.update_list)
+        self.filter_entry.bind("<KeyRelease>", self.schedule_update_list)
 
         tk.Label(left_frame, text="View:").grid(row=8, column=0, sticky="w", pady=1)
         self.view_mode = tk.StringVar(value="Both")
@@ -185,9 +157,9 @@ class App:
 
         tk.Label(left_frame, text="Sort By:").grid(row=9, column=0, sticky="w", pady=1)
         self.sort_mode = tk.StringVar(value="Name")
-        self.sort_combo = ttk.Combobox(left_frame, textvariable=self.sort_mode, values=["Name", "Change"])
+        self.sort_combo = ttk.Combobox(left_frame, textvariable=self.sort_mode, values=list(SORT_MODES))
         self.sort_combo.grid(row=9, column=1, pady=1)
-        self.sort_combo.bind("<<ComboboxSelected>>", self.update_list)
+        self.sort_combo.bind("<<ComboboxSelected>>", self.select_sort)
 
         # Notebook for tabs
         self.notebook = ttk.Notebook(root)
@@ -197,12 +169,34 @@ class App:
         details_frame = tk.Frame(self.notebook)
         self.notebook.add(details_frame, text="Details")
 
-        self.results_tree = ttk.Treeview(details_frame, columns=("Item", "Change"), show="headings", height=20)
+        # The tree only ever holds as many rows as fit on screen; scrolling
+        # rebinds those rows to a different slice of self.list_items, so the
+        # selection is kept as a model row and reapplied by render_rows
+        self.results_tree = ttk.Treeview(details_frame, columns=("Item", "Change", "Value"), show="headings", height=20)
         self.results_tree.heading("Item", text="Item", command=lambda: self.treeview_sort_column(self.results_tree, "Item", False))
         self.results_tree.heading("Change", text="Change", command=lambda: self.treeview_sort_column(self.results_tree, "Change", False))
+        self.results_tree.heading("Value", text="Value", command=lambda: self.treeview_sort_column(self.results_tree, "Value", False))
         self.results_tree.column("Item", width=400)
         self.results_tree.column("Change", width=100)
+        self.results_tree.column("Value", width=120)
+        self.results_scroll = ttk.Scrollbar(details_frame, orient="vertical", command=self.scroll_list)
+        self.results_scroll.pack(side="right", fill="y")
         self.results_tree.pack(fill="both", expand=True)
+        self.results_tree.bind("<Configure>", lambda event: self.root.after_idle(self.fit_rows))
+        self.results_tree.bind("<MouseWheel>", lambda event: self.scroll_list("scroll", -1 if event.delta > 0 else 1, "units"))
+        self.results_tree.bind("<Button-4>", lambda event: self.scroll_list("scroll", -1, "units"))
+        self.results_tree.bind("<Button-5>", lambda event: self.scroll_list("scroll", 1, "units"))
+        self.results_tree.bind("<Up>", lambda event: self.move_selection(-1))
+        self.results_tree.bind("<Down>", lambda event: self.move_selection(1))
+        self.results_tree.bind("<Prior>", lambda event: self.move_selection(-len(self.row_ids)))
+        self.results_tree.bind("<Next>", lambda event: self.move_selection(len(self.row_ids)))
+        self.results_tree.bind("<<TreeviewSelect>>", self.select_row)
+        self.row_ids = []
+        self.selected_row = None
+        self.model = DiffModel({}, {})
+        self.column_sort = None
+        self.list_items = []
+        self.list_offset = 0
 
         self.results_tree.tag_configure("oddrow", background="#f0f0f0")
         self.results_tree.tag_configure("evenrow", background="#ffffff")
@@ -210,7 +204,7 @@ class App:
         self.results_tree.tag_configure("lost", foreground="red")
 
         style = ttk.Style()
-        style.configure("Treeview", rowheight=25)
+        style.configure("Treeview", rowheight=ROW_HEIGHT)
         style.configure("Treeview.Heading", font=("Arial", 12))
 
         # Summary tab
@@ -226,8 +220,32 @@ class App:
         self.summary_text.tag_configure("green", foreground="green")
         self.summary_text.tag_configure("red", foreground="red")
 
+        status_frame = tk.Frame(root)
+        status_frame.grid(row=10, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        self.status = tk.Label(status_frame, text="", anchor="w")
+        self.status.pack(side="left", fill="x", expand=True)
+        # Stage timings of the last load, comparison or list update
+        self.timing_label = tk.Label(status_frame, text="", anchor="w", fg="gray40")
+        self.timing_label.pack(side="left")
+        self.cancel_button = tk.Button(status_frame, text="Cancel", state="disabled", command=self.cancel_load)
+        self.cancel_button.pack(side="right")
+        self.progress = ttk.Progressbar(status_frame, length=200, mode="determinate")
+        self.progress.pack(side="right", padx=5)
+
         self.conn = init_db()
-        self.timestamps = {}
+        self.cancel_event = threading.Event()
+        self.worker = DbWorker(self.show_error)
+        self.worker.start()
+        self.root.after(50, self.poll_worker)
+        self.changes = {}
+        self.item_meta = {}
+        self.totals = {}
+        self.compared = None
+        self.timing = None
+        self.filter_job = None
+        self.summary = None
+        self.summary_source = None
+        self.summary_view = None
         self.ref_ts = None
         self.comp_ts = None
         self.prev_char = None
@@ -238,10 +256,60 @@ class App:
         if folder:
             self.folder.set(folder)
 
+    def poll_worker(self):
+        try:
+            while True:
+                fn, args = self.worker.ui_queue.get_nowait()
+                fn(*args)
+        except queue.Empty:
+            pass
+        self.root.after(50, self.poll_worker)
+
+    def show_error(self, error):
+        self.progress.config(value=0)
+        self.cancel_button.config(state="disabled")
+        self.status.config(text=f"Error: {error}")
+
+    def show_failed(self, error, timing):
+        self.show_timing(timing, f"failed: {error}")
+        self.show_error(error)
+
+    def report_progress(self, done, total):
+        # Called on the worker thread
+        self.worker.post(self.progress.config, {"value": done, "maximum": total})
+
+    def cancel_load(self):
+        self.cancel_event.set()
+        self.status.config(text="Cancelling...")
+
     def load_data(self):
         self.prev_char = self.char_combo.get()
         self.prev_ref_ts = self.ref_ts_combo.get()
-        load_json_files(self.folder.get(), self.conn)
+        folder = self.folder.get()
+        bulk = self.bulk_import.get()
+        workers = self.workers.get()
+        self.cancel_event.clear()
+        self.cancel_button.config(state="normal")
+        self.status.config(text="Loading reports...")
+        timing = Timing("ingest")
+        self.worker.submit(
+            lambda conn: load_json_files(folder, conn, bulk=bulk, workers=workers, progress=self.report_progress,
+                                         cancel=self.cancel_event, timing=timing),
+            lambda counts: self.show_loaded(counts, timing),
+            lambda error: self.show_failed(error, timing)
+        )
+
+    def show_timing(self, timing, outcome=None):
+        self.timing_label.config(text=timing.finish(outcome))
+
+    def show_loaded(self, counts, timing):
+        self.show_timing(timing)
+        self.progress.config(value=0)
+        self.cancel_button.config(state="disabled")
+        status = f"Files: {counts['ingested']} ingested, {counts['skipped']} skipped, {counts['failed']} failed"
+        if counts["cancelled"]:
+            status += " (cancelled)"
+        self.status.config(text=status)
         chars = get_characters(self.conn)
         self.char_combo['values'] = chars
         if chars:
@@ -255,7 +323,6 @@ class App:
         char = self.char_combo.get()
         if char:
             ts_list = get_timestamps_for_char(self.conn, char)
-            self.timestamps[char] = ts_list
             self.ref_ts_combo['values'] = ts_list
             if ts_list:
                 if self.prev_ref_ts in ts_list:
@@ -268,10 +335,7 @@ class App:
         char = self.char_combo.get()
         ref_ts = self.ref_ts_combo.get()
         if char and ref_ts:
-            all_ts = self.timestamps.get(char, [])
-            ref_dt = parse_timestamp(ref_ts)
-            later_ts = [ts for ts in all_ts if parse_timestamp(ts) > ref_dt]
-            later_ts = sorted(later_ts, key=parse_timestamp, reverse=True)
+            later_ts = get_later_timestamps(self.conn, char, ref_ts)
             later_ts.insert(0, "Latest")
             self.comp_ts_combo['values'] = later_ts
             if later_ts:
@@ -279,40 +343,29 @@ class App:
 
     def compare(self):
         char = self.char_combo.get()
-        self.ref_ts = self.ref_ts_combo.get()
+        ref_ts = self.ref_ts_combo.get()
         comp_sel = self.comp_ts_combo.get()
+        folder = self.folder.get()
+        timing = Timing("compare")
+        self.worker.submit(
+            lambda conn: compare_job(conn, folder, char, ref_ts, comp_sel, timing),
+            lambda result: self.show_comparison(char, ref_ts, *result, timing=timing),
+            lambda error: self.show_failed(error, timing)
+        )
 
-        if comp_sel == "Latest":
-            new_ts = load_latest_if_new(self.folder.get(), self.conn, char)
-            if new_ts:
-                self.prev_char = char
-                self.prev_ref_ts = self.ref_ts
-                self.update_ref_timestamps()
-                self.comp_ts = new_ts
-            else:
-                all_ts = self.timestamps.get(char, [])
-                if all_ts:
-                    self.comp_ts = max(all_ts, key=parse_timestamp)
-                else:
-                    self.comp_ts = None
-        else:
-            self.comp_ts = comp_sel
+    def show_comparison(self, char, ref_ts, new_ts, comp_ts, changes, item_meta, totals, timing=None):
+        self.ref_ts = ref_ts
+        if new_ts:
+            self.prev_char = char
+            self.prev_ref_ts = ref_ts
+            self.update_ref_timestamps()
+        self.comp_ts = comp_ts
 
         if not self.ref_ts or not self.comp_ts:
+            if timing:
+                self.show_timing(timing, "no snapshot to compare")
             return
 
-        ref_items = get_items_at_timestamp(self.conn, char, self.ref_ts)
-        comp_items = get_items_at_timestamp(self.conn, char, self.comp_ts)
-
-        changes = {}
-        all_names = set(ref_items.keys()) | set(comp_items.keys())
-        for name in all_names:
-            ref_qty = ref_items.get(name, 0)
-            comp_qty = comp_items.get(name, 0)
-            delta = comp_qty - ref_qty
-            if delta != 0:
-                changes[name] = delta
-
         ref_dt = parse_timestamp(self.ref_ts)
         comp_dt = parse_timestamp(self.comp_ts)
         delta_time = comp_dt - ref_dt
@@ -322,94 +375,150 @@ class App:
         self.time_diff.config(text=f"Time between logs: {days} days, {hours} hours, {minutes} minutes")
 
         self.changes = changes
+        self.item_meta = item_meta
+        self.totals = totals
+        self.compared = (char, self.ref_ts, self.comp_ts)
+        # A cached model keeps the orderings already computed for this pair
+        self.model = snapshot_cache.get(("model",) + self.compared, lambda: DiffModel(changes, item_meta))
+        self.selected_row = None
+        stats = snapshot_cache.stats()
+        self.status.config(text=f"{len(changes)} items changed (cache: {stats['hits']} hits, {stats['misses']} misses)")
+        # update_list adds its stages to this comparison's timing
+        self.timing = timing or Timing("compare")
+        try:
+            self.update_list()
+        finally:
+            timing, self.timing = self.timing, None
+        self.show_timing(timing)
+
+    def schedule_update_list(self, event=None):
+        # Wait for a pause in typing before refiltering
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DEBOUNCE_MS, self.update_list)
+
+    def fit_rows(self):
+        tv = self.results_tree
+        bbox = tv.bbox(self.row_ids[0]) if self.row_ids else None
+        heading = bbox[1] if bbox else ROW_HEIGHT
+        count = max(1, (tv.winfo_height() - heading) // ROW_HEIGHT)
+        while len(self.row_ids) < count:
+            self.row_ids.append(tv.insert("", "end"))
+        if len(self.row_ids) > count:
+            tv.delete(*self.row_ids[count:])
+            del self.row_ids[count:]
+        self.render_rows()
+
+    def scroll_list(self, action, amount, unit=None):
+        if action == "moveto":
+            offset = int(float(amount) * len(self.list_items))
+        elif unit == "pages":
+            offset = self.list_offset + int(amount) * len(self.row_ids)
+        else:
+            offset = self.list_offset + int(amount)
+        self.list_offset = offset
+        self.render_rows()
+        return "break"
+
+    def render_rows(self):
+        tv = self.results_tree
+        total = len(self.list_items)
+        visible = len(self.row_ids)
+        self.list_offset = max(0, min(self.list_offset, total - visible))
+        for i, iid in enumerate(self.row_ids):
+            index = self.list_offset + i
+            if index < total:
+                row = self.list_items[index]
+                delta = self.model.deltas[row]
+                value = self.model.values[row]
+                sign = "+" if delta > 0 else ""
+                tag = "gained" if delta > 0 else "lost"
+                row_tag = "evenrow" if index % 2 == 0 else "oddrow"
+                value_text = f"{value:,}" if value is not None else ""
+                tv.item(iid, values=(self.model.names[row], f"{sign}{delta}", value_text), tags=(tag, row_tag))
+                tv.move(iid, "", i)
+            else:
+                tv.detach(iid)
+        shown = self.list_items[self.list_offset:self.list_offset + visible]
+        tv.selection_set([iid for iid, row in zip(self.row_ids, shown) if row == self.selected_row])
+        if total:
+            self.results_scroll.set(self.list_offset / total, min(1.0, (self.list_offset + visible) / total))
+        else:
+            self.results_scroll.set(0.0, 1.0)
+
+    def select_row(self, event=None):
+        selected = self.results_tree.selection()
+        shown = self.list_items[self.list_offset:self.list_offset + len(self.row_ids)]
+        rows = [row for iid, row in zip(self.row_ids, shown) if iid in selected]
+        # Scrolling the selected row off screen empties the tree's selection too
+        if rows:
+            self.selected_row = rows[0]
+        elif self.selected_row in shown:
+            self.selected_row = None
+
+    def move_selection(self, step):
+        # Arrow and page keys move through the whole list, not just the rows on screen
+        if not self.list_items:
+            return "break"
+        if self.selected_row in self.list_items:
+            position = self.list_items.index(self.selected_row) + step
+        else:
+            position = self.list_offset
+        position = max(0, min(position, len(self.list_items) - 1))
+        self.selected_row = self.list_items[position]
+        if position < self.list_offset:
+            self.list_offset = position
+        elif position >= self.list_offset + len(self.row_ids):
+            self.list_offset = position - len(self.row_ids) + 1
+        self.render_rows()
+        return "break"
+
+    def select_sort(self, event=None):
+        # The Sort By box takes over from any column header sort
+        self.column_sort = None
         self.update_list()
 
     def update_list(self, event=None):
-        filter_text = self.filter_entry.get().lower()
+        timing = self.timing or Timing("list")
+        self.filter_job = None
+        key, reverse = self.column_sort or SORT_MODES.get(self.sort_mode.get(), SORT_MODES["Name"])
+        with timing.stage("filter") as stage:
+            self.list_items = self.model.rows(key, reverse, self.view_mode.get(), self.filter_entry.get().lower())
+            stage["rows"] = len(self.list_items)
+        self.list_offset = 0
+        with timing.stage("treeview", rows=len(self.row_ids)):
+            self.render_rows()
+        self.update_summary(timing)
+        if timing is not self.timing:
+            self.show_timing(timing)
+
+    def update_summary(self, timing):
         view = self.view_mode.get()
-        sort = self.sort_mode.get()
-        self.results_tree.delete(*self.results_tree.get_children())
-        items = list(self.changes.items())
-        if view == "Gained":
-            items = [item for item in items if item[1] > 0]
-        elif view == "Lost":
-            items = [item for item in items if item[1] < 0]
-        items = [item for item in items if filter_text in item[0].lower()]
-        if sort == "Name":
-            items.sort(key=lambda x: x[0])
-        else:
-            items.sort(key=lambda x: -abs(x[1]))
-        for i, (name, delta) in enumerate(items):
-            sign = "+" if delta > 0 else ""
-            tag = "gained" if delta > 0 else "lost"
-            row_tag = "evenrow" if i % 2 == 0 else "oddrow"
-            self.results_tree.insert("", "end", values=(name, f"{sign}{delta}"), tags=(tag, row_tag))
-        self.update_summary()
-
-    def update_summary(self):
-        view = self.view_mode.get()
-        self.summary_text.delete(1.0, tk.END)
-        if not hasattr(self, 'changes'):
+        if self.compared is None:
             return
-
-        gained = {name: d for name, d in self.changes.items() if d > 0}
-        lost = {name: -d for name, d in self.changes.items() if d < 0}
-
-        cursor = self.conn.cursor()
-        rarity_counts = {}
-        rarity_values = {}
-        misc_over_1k = 0
-        misc_under_1k = 0
-        misc_over_1k_value = 0
-        misc_under_1k_value = 0
-        phlogiston_prism_items = {}
-
-        # Calculate totals for gained items
-        for name, delta in gained.items():
-            cursor.execute("SELECT rarity, value FROM inventories WHERE item_name=? ORDER BY timestamp DESC LIMIT 1", (name,))
-            row = cursor.fetchone()
-            rarity, value = (row if row else (None, None))
-
-            # Check for Phlogiston or Prism items
-            if "phlogiston" in name.lower() or "prism" in name.lower():
-                phlogiston_prism_items[name] = delta
-
-            if rarity:
-                rarity_counts[rarity] = rarity_counts.get(rarity, 0) + delta
-                if value is not None:
-                    rarity_values[rarity] = rarity_values.get(rarity, 0) + (value * delta)
-            elif value is not None:
-                if value >= 1000:
-                    misc_over_1k += delta
-                    misc_over_1k_value += value * delta
-                else:
-                    misc_under_1k += delta
-                    misc_under_1k_value += value * delta
-
-        # Check lost items for Phlogiston/Prism
-        for name, delta in lost.items():
-            if "phlogiston" in name.lower() or "prism" in name.lower():
-                if name in phlogiston_prism_items:
-                    phlogiston_prism_items[name] -= delta
-                else:
-                    phlogiston_prism_items[name] = -delta
-
-        total_gained = sum(gained.values())
-        total_lost = sum(lost.values())
+        if self.summary_source is self.changes and self.summary_view == view:
+            return
+        start = time.perf_counter()
+        if self.summary_source is not self.changes:
+            self.summary = get_summary(*self.compared, self.changes, self.item_meta)
+            self.summary_source = self.changes
+        self.summary_view = view
+        s = self.summary
+        self.summary_text.delete(1.0, tk.END)
 
         # Display overall totals
-        if view in ["Both", "Gained"] and total_gained > 0:
+        if view in ["Both", "Gained"] and s["total_gained"] > 0:
             self.summary_text.insert(tk.END, "Overall Gained: ", "bold")
-            self.summary_text.insert(tk.END, f"+{total_gained}\n", "green")
+            self.summary_text.insert(tk.END, f"+{s['total_gained']}\n", "green")
         
-        if view in ["Both", "Lost"] and total_lost > 0:
+        if view in ["Both", "Lost"] and s["total_lost"] > 0:
             self.summary_text.insert(tk.END, "Overall Lost: ", "bold")
-            self.summary_text.insert(tk.END, f"-{total_lost}\n", "red")
+            self.summary_text.insert(tk.END, f"-{s['total_lost']}\n", "red")
 
         # Phlogiston and Prism items section
-        if phlogiston_prism_items:
+        if s["phlogiston_prism_items"]:
             self.summary_text.insert(tk.END, "\nPhlogiston & Prism Items:\n", "header")
-            for item_name, change in sorted(phlogiston_prism_items.items()):
+            for item_name, change in sorted(s["phlogiston_prism_items"].items()):
                 if change != 0:
                     self.summary_text.insert(tk.END, f"  {item_name}: ")
                     sign = "+" if change > 0 else ""
@@ -417,11 +526,11 @@ class App:
                     self.summary_text.insert(tk.END, f"{sign}{change}\n", color)
 
         # Rarity breakdown with values
-        if rarity_counts:
+        if s["rarity_counts"]:
             self.summary_text.insert(tk.END, "\nRarity Breakdown:\n", "header")
-            for rarity in sorted(rarity_counts.keys()):
-                count = rarity_counts[rarity]
-                value = rarity_values.get(rarity, 0)
+            for rarity in sorted(s["rarity_counts"].keys()):
+                count = s["rarity_counts"][rarity]
+                value = s["rarity_values"].get(rarity, 0)
                 self.summary_text.insert(tk.END, f"  {rarity} Gear: ")
                 self.summary_text.insert(tk.END, f"+{count}", "green")
                 if value > 0:
@@ -431,36 +540,51 @@ class App:
                     self.summary_text.insert(tk.END, "\n")
 
         # Misc breakdown with values
-        if misc_over_1k or misc_under_1k:
+        if s["misc_over_1k"] or s["misc_under_1k"]:
             self.summary_text.insert(tk.END, "\nMisc Items:\n", "header")
-            if misc_over_1k:
+            if s["misc_over_1k"]:
                 self.summary_text.insert(tk.END, f"  Misc over 1k: ")
-                self.summary_text.insert(tk.END, f"+{misc_over_1k}", "green")
+                self.summary_text.insert(tk.END, f"+{s['misc_over_1k']}", "green")
                 self.summary_text.insert(tk.END, f" | Value: ")
-                self.summary_text.insert(tk.END, f"{misc_over_1k_value:,}\n", "green")
-            if misc_under_1k:
+                self.summary_text.insert(tk.END, f"{s['misc_over_1k_value']:,}\n", "green")
+            if s["misc_under_1k"]:
                 self.summary_text.insert(tk.END, f"  Misc under 1k: ")
-                self.summary_text.insert(tk.END, f"+{misc_under_1k}", "green")
+                self.summary_text.insert(tk.END, f"+{s['misc_under_1k']}", "green")
                 self.summary_text.insert(tk.END, f" | Value: ")
-                self.summary_text.insert(tk.END, f"{misc_under_1k_value:,}\n", "green")
+                self.summary_text.insert(tk.END, f"{s['misc_under_1k_value']:,}\n", "green")
 
         # Total value summary
-        total_category_value = sum(rarity_values.values()) + misc_over_1k_value + misc_under_1k_value
-        if total_category_value > 0:
+        if s["total_category_value"] > 0:
             self.summary_text.insert(tk.END, f"\nTotal Value of All Categories: ", "bold")
-            self.summary_text.insert(tk.END, f"{total_category_value:,}\n", "green")
+            self.summary_text.insert(tk.END, f"{s['total_category_value']:,}\n", "green")
+
+        # Net change per category, straight from the stored snapshot totals
+        if self.totals:
+            self.summary_text.insert(tk.END, "\nNet Change by Category:\n", "header")
+            for category in sorted(self.totals):
+                qty, value = self.totals[category]
+                label = category if category.startswith("Misc") else f"{category} Gear"
+                self.summary_text.insert(tk.END, f"  {label}: ")
+                self.summary_text.insert(tk.END, f"{qty:+}", "green" if qty >= 0 else "red")
+                self.summary_text.insert(tk.END, f" | Value: ")
+                self.summary_text.insert(tk.END, f"{value:+,}\n", "green" if value >= 0 else "red")
+            net = sum(value for _, value in self.totals.values())
+            self.summary_text.insert(tk.END, "\nNet Worth Change: ", "bold")
+            self.summary_text.insert(tk.END, f"{net:+,}\n", "green" if net >= 0 else "red")
+        timing.add("summary", time.perf_counter() - start, len(self.changes))
 
     def treeview_sort_column(self, tv, col, reverse):
-        items = [(tv.set(k, col), k) for k in tv.get_children('')]
-        try:
-            items.sort(key=lambda t: int(t[0]), reverse=reverse)
-        except ValueError:
-            items.sort(reverse=reverse)
-        for index, (val, k) in enumerate(items):
-            tv.move(k, '', index)
+        self.column_sort = (COLUMN_SORT_KEYS[col], reverse)
+        self.update_list()
         tv.heading(col, command=lambda: self.treeview_sort_column(tv, col, not reverse))
 
 if __name__ == "__main__":
+    setup_logging()
     root = tk.Tk()
     app = App(root)
-    root.mainloop()
+    # Set ITEMCOMPARE_PROFILE=<file> to profile the session; the worker thread's
+    # stats go to <file>.worker
+    run_profiled(root.mainloop)
+    if os.environ.get(PROFILE_ENV):
+        app.worker.stop()
+        app.worker.join(timeout=5)
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import platform
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timezone
+
+import ItemCompareCore as core
+from ItemCompareCore import (
+    init_db, load_json_files, get_timestamps_for_char, compare_job, summarize_changes, snapshot_cache,
+)
+from ItemCompareGen import generate_reports
+
+try:
+    import ItemCompare
+except ImportError:
+    ItemCompare = None
+
+def timed(fn, repeat, setup=None):
+    # Runs setup (untimed) then fn, repeat times; returns (timing stats in seconds, last result)
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    stats = {"runs": repeat, "min": min(times), "median": statistics.median(times),
+             "mean": statistics.fmean(times), "max": max(times)}
+    return stats, result
+
+def clear_cache():
+    snapshot_cache.discard(lambda key: True)
+
+def bench_ingest(results, folder, workdir, repeat, bulk, workers):
+    # Each cold run loads into a new database file; returns the last one's connection and path
+    state = {"run": 0}
+
+    def setup():
+        state["run"] += 1
+        core.report_indexes.clear()
+        state["path"] = os.path.join(workdir, f"{'bulk' if bulk else 'serial'}-{state['run']}.db")
+        state["conn"] = init_db(state["path"])
+
+    name = "ingest_cold_bulk" if bulk else "ingest_cold"
+    results[name], counts = timed(lambda: load_json_files(folder, state["conn"], bulk=bulk, workers=workers),
+                                  repeat, setup)
+    results[name]["rows"] = counts["ingested"]
+    return state["conn"], state["path"]
+
+def bench_core(results, conn, folder, char, repeat):
+    timestamps = get_timestamps_for_char(conn, char)
+    ref_ts, comp_ts = timestamps[-1], timestamps[0]
+    results["ingest_warm"], counts = timed(lambda: load_json_files(folder, conn), repeat)
+    results["ingest_warm"]["rows"] = counts["skipped"]
+
+    run = lambda: compare_job(conn, None, char, ref_ts, comp_ts)
+    results["compare_cold"], (_, _, changes, item_meta, totals) = timed(run, repeat, clear_cache)
+    results["compare_warm"], _ = timed(run, repeat)
+    results["compare_cold"]["rows"] = results["compare_warm"]["rows"] = len(changes)
+
+    results["summary"], _ = timed(lambda: summarize_changes(changes, item_meta), repeat)
+    results["summary"]["rows"] = len(changes)
+    return ref_ts, comp_ts, changes, item_meta, totals
+
+def bench_list_model(results, changes, item_meta, repeat):
+    # The Details list work update_list does before touching the Treeview
+    def build():
+        model = ItemCompare.DiffModel(changes, item_meta)
+        return model, model.rows("name")
+
+    results["list_model"], (model, _) = timed(build, repeat)
+    model.orderings.clear()
+    results["list_sort"], _ = timed(
+        lambda: [model.rows(key, reverse) for key, reverse in ItemCompare.SORT_MODES.values()], repeat,
+        model.orderings.clear)
+    results["list_filter"], _ = timed(lambda: model.rows("name", False, "Both", "ore"), repeat)
+    for name in ("list_model", "list_sort", "list_filter"):
+        results[name]["rows"] = len(changes)
+
+def bench_tk(results, db_path, char, comparison, repeat):
+    # Full show_comparison/update_list/update_summary on a real window; needs a display
+    tk = ItemCompare.tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return str(e)
+    core.DB_FILE = db_path
+    root.geometry("1200x800")
+    app = ItemCompare.App(root)
+    root.update()
+    ref_ts, comp_ts, changes, item_meta, totals = comparison
+
+    def render():
+        app.show_comparison(char, ref_ts, None, comp_ts, changes, item_meta, totals)
+        root.update_idletasks()
+
+    def fresh():
+        clear_cache()
+        app.summary_source = None
+
+    results["list_render"], _ = timed(render, repeat, fresh)
+
+    def toggle_view():
+        app.view_mode.set("Gained" if app.view_mode.get() != "Gained" else "Both")
+        app.update_list()
+        root.update_idletasks()
+
+    results["list_update"], _ = timed(toggle_view, repeat)
+
+    def resummarize():
+        app.summary_source = None
+        app.update_summary(core.Timing("summary"))
+
+    results["summary_render"], _ = timed(resummarize, repeat)
+    for name in ("list_render", "list_update", "summary_render"):
+        results[name]["rows"] = len(changes)
+    root.destroy()
+    return None
+
+def compare_to_baseline(results, baseline_path, out):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    out.write(f"\n{'benchmark':<18}{'baseline ms':>14}{'current ms':>14}{'change':>10}\n")
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = (stats["median"] - old["median"]) / old["median"] * 100 if old["median"] else 0.0
+        out.write(f"{name:<18}{old['median'] * 1000:>14.2f}{stats['median'] * 1000:>14.2f}{change:>+9.1f}%\n")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, compare, summary and list rendering")
+    parser.add_argument("--folder", default=None, help="existing reports to use instead of generating them")
+    parser.add_argument("--characters", type=int, default=3)
+    parser.add_argument("--snapshots", type=int, default=50)
+    parser.add_argument("--items", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark")
+    parser.add_argument("--ingest-repeat", type=int, default=2, help="runs per cold ingest")
+    parser.add_argument("--bulk", action="store_true", help="also time a cold bulk import")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-tk", action="store_true", help="skip the benchmarks that need a display")
+    parser.add_argument("--output", default="benchmark.json", help="results file (default: benchmark.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="itemcompare-bench-")
+    try:
+        folder = args.folder
+        if folder is None:
+            folder = os.path.join(workdir, "reports")
+            generate_reports(folder, args.characters, args.snapshots, args.items, seed=args.seed)
+        results = {}
+        skipped = {}
+        conn, db_path = bench_ingest(results, folder, workdir, args.ingest_repeat, False, None)
+        if args.bulk:
+            bench_ingest(results, folder, workdir, args.ingest_repeat, True, args.workers)
+        char = conn.execute("SELECT name FROM characters ORDER BY name LIMIT 1").fetchone()[0]
+        comparison = bench_core(results, conn, folder, char, args.repeat)
+        if ItemCompare is None:
+            skipped["list"] = "tkinter is not available"
+        else:
+            bench_list_model(results, comparison[2], comparison[3], args.repeat)
+            if args.no_tk:
+                skipped["tk"] = "--no-tk"
+            else:
+                reason = bench_tk(results, db_path, char, comparison, args.repeat)
+                if reason:
+                    skipped["tk"] = reason
+
+        snapshots, rows = conn.execute("SELECT COUNT(*), (SELECT COUNT(*) FROM snapshot_items) FROM snapshots").fetchone()
+        report = {
+            "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": core.np is not None,
+            "platform": platform.platform(),
+            "dataset": {"folder": args.folder, "characters": args.characters, "snapshots": args.snapshots,
+                        "items": args.items, "seed": args.seed, "stored_snapshots": snapshots,
+                        "stored_rows": rows, "compared": char},
+            "results": results,
+            "skipped": skipped,
+        }
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    sys.stdout.write(f"{'benchmark':<18}{'median ms':>12}{'rows':>8}\n")
+    for name, stats in results.items():
+        sys.stdout.write(f"{name:<18}{stats['median'] * 1000:>12.2f}{stats.get('rows', ''):>8}\n")
+    for name, reason in skipped.items():
+        sys.stdout.write(f"{name:<18}skipped: {reason}\n")
+    if args.baseline:
+        compare_to_baseline(results, args.baseline, sys.stdout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
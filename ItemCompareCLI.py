@@ -0,0 +1,179 @@
+import sys
+import csv
+import logging
+import json
+import calendar
+import argparse
+from datetime import datetime
+
+from ItemCompareCore import (
+    init_db, load_json_files, get_characters, get_timestamps_for_char,
+    get_snapshot_id, summarize_changes, get_summary, compare_job, batch_compare, get_net_worth_history,
+    compact_snapshots, KEYFRAME_INTERVAL, log, run_profiled,
+)
+
+def summary_rows(summary):
+    # The Summary tab's lines as flat (category, count, value) rows
+    rows = [
+        {"category": "Overall Gained", "count": summary["total_gained"], "value": None},
+        {"category": "Overall Lost", "count": summary["total_lost"], "value": None},
+    ]
+    for name, change in sorted(summary["phlogiston_prism_items"].items()):
+        if change != 0:
+            rows.append({"category": name, "count": change, "value": None})
+    for rarity in sorted(summary["rarity_counts"]):
+        rows.append({"category": f"{rarity} Gear", "count": summary["rarity_counts"][rarity],
+                     "value": summary["rarity_values"].get(rarity, 0)})
+    if summary["misc_over_1k"]:
+        rows.append({"category": "Misc over 1k", "count": summary["misc_over_1k"], "value": summary["misc_over_1k_value"]})
+    if summary["misc_under_1k"]:
+        rows.append({"category": "Misc under 1k", "count": summary["misc_under_1k"], "value": summary["misc_under_1k_value"]})
+    rows.append({"category": "Total Value of All Categories", "count": None, "value": summary["total_category_value"]})
+    return rows
+
+def write_output(data, rows, fmt, out):
+    # JSON gets the structured result; CSV gets the flat rows
+    if fmt == "json":
+        json.dump(data, out, indent=2)
+        out.write("\n")
+    else:
+        if not rows:
+            return
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]), lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+
+def run_compare(conn, args):
+    if get_snapshot_id(conn, args.character, args.ref) is None:
+        raise SystemExit(f"No snapshot for {args.character} at {args.ref}")
+    if args.comp != "Latest" and get_snapshot_id(conn, args.character, args.comp) is None:
+        raise SystemExit(f"No snapshot for {args.character} at {args.comp}")
+    _, comp_ts, changes, item_meta, totals = compare_job(conn, args.folder, args.character, args.ref, args.comp)
+    return comp_ts, changes, item_meta, totals
+
+def cmd_ingest(conn, args):
+    counts = load_json_files(args.folder, conn, bulk=args.bulk, workers=args.workers)
+    return counts, [counts]
+
+def cmd_compare(conn, args):
+    comp_ts, changes, item_meta, _ = run_compare(conn, args)
+    rows = [{"item": name, "change": delta, "rarity": item_meta[name][0], "value": item_meta[name][1]}
+            for name, delta in sorted(changes.items())]
+    return {"character": args.character, "ref": args.ref, "comp": comp_ts, "changes": rows}, rows
+
+def cmd_summary(conn, args):
+    comp_ts, changes, item_meta, totals = run_compare(conn, args)
+    summary = get_summary(args.character, args.ref, comp_ts, changes, item_meta)
+    net_change = {category: {"count": qty, "value": value} for category, (qty, value) in sorted(totals.items())}
+    rows = summary_rows(summary)
+    rows.extend({"category": f"Net {category}", **change} for category, change in net_change.items())
+    data = {"character": args.character, "ref": args.ref, "comp": comp_ts, "summary": summary, "net_change": net_change}
+    return data, rows
+
+def parse_date_arg(text):
+    for fmt in ("%Y-%m-%d %H:%M:%SZ", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(datetime.strptime(text, fmt).timetuple())
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"invalid date: {text!r}")
+
+def keyframe_interval_arg(text):
+    try:
+        interval = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid interval: {text!r}")
+    if interval < 1:
+        raise argparse.ArgumentTypeError(f"interval must be at least 1: {text!r}")
+    return interval
+
+def cmd_batch(conn, args):
+    if args.start is not None or args.end is not None:
+        if args.start is None or args.end is None:
+            raise SystemExit("--start and --end must be given together")
+        return cmd_batch_dates(conn, args)
+    # Every character's latest snapshot against the one before it
+    results = []
+    rows = []
+    for char in get_characters(conn):
+        timestamps = get_timestamps_for_char(conn, char)
+        if len(timestamps) < 2:
+            continue
+        ref_ts, comp_ts = timestamps[1], timestamps[0]
+        _, _, changes, item_meta, _ = compare_job(conn, None, char, ref_ts, comp_ts)
+        summary = summarize_changes(changes, item_meta)
+        results.append({"character": char, "ref": ref_ts, "comp": comp_ts, "summary": summary})
+        for row in summary_rows(summary):
+            rows.append({"character": char, "ref": ref_ts, "comp": comp_ts, **row})
+    return results, rows
+
+def cmd_batch_dates(conn, args):
+    # Every character's snapshots closest to the two dates, plus the account-wide total
+    result = batch_compare(conn, args.start, args.end)
+    rows = [{"character": "*", "ref": None, "comp": None, **row} for row in summary_rows(result["account"])]
+    for entry in result["characters"]:
+        for row in summary_rows(entry["summary"]):
+            rows.append({"character": entry["character"], "ref": entry["ref"], "comp": entry["comp"], **row})
+    return result, rows
+
+def cmd_networth(conn, args):
+    rows = [{"timestamp": ts, "items": items, "net_worth": net_worth}
+            for ts, items, net_worth in get_net_worth_history(conn, args.character)]
+    return {"character": args.character, "history": rows}, rows
+
+def cmd_compact(conn, args):
+    counts = compact_snapshots(conn, args.keyframe_interval)
+    return counts, [counts]
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Project Gorgon inventory comparator (headless)")
+    parser.add_argument("--db", default=None, help="SQLite database file (default: inventory.db)")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--timings", action="store_true", help="print stage timings to stderr")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="load new or changed reports from a folder")
+    p.add_argument("folder")
+    p.add_argument("--bulk", action="store_true", help="parse reports in a process pool")
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=cmd_ingest)
+
+    for name, func, help_text in [("compare", cmd_compare, "per-item changes between two snapshots"),
+                                  ("summary", cmd_summary, "Summary tab figures between two snapshots")]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("character")
+        p.add_argument("ref", help='reference timestamp, e.g. "2024-01-02 03:04:05Z"')
+        p.add_argument("comp", help='timestamp to compare to, or "Latest"')
+        p.add_argument("--folder", default=None, help='Reports folder, needed for "Latest"')
+        p.set_defaults(func=func)
+
+    p = sub.add_parser("batch", help="summary of every character's latest change, or between two dates")
+    p.add_argument("--start", type=parse_date_arg, default=None, help="YYYY-MM-DD[ HH:MM:SS]; uses each character's closest snapshot")
+    p.add_argument("--end", type=parse_date_arg, default=None, help="YYYY-MM-DD[ HH:MM:SS]; uses each character's closest snapshot")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("networth", help="total value of a character's inventory at every snapshot")
+    p.add_argument("character")
+    p.set_defaults(func=cmd_networth)
+
+    p = sub.add_parser("compact", help="share identical snapshots and store most others as deltas")
+    p.add_argument("--keyframe-interval", type=keyframe_interval_arg, default=KEYFRAME_INTERVAL,
+                   help=f"keep every Nth snapshot of a character in full (default: {KEYFRAME_INTERVAL}; 1 expands all)")
+    p.set_defaults(func=cmd_compact)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "comp", None) == "Latest" and not args.folder:
+        raise SystemExit('--folder is required to compare to "Latest"')
+    if args.timings:
+        log.addHandler(logging.StreamHandler(sys.stderr))
+        log.setLevel(logging.INFO)
+    conn = init_db(args.db)
+    # Set ITEMCOMPARE_PROFILE=<file> to write cProfile stats for the command
+    data, rows = run_profiled(lambda: args.func(conn, args))
+    write_output(data, rows, args.format, sys.stdout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+
+import ItemCompareCore as core
+from ItemCompareCore import (
+    init_db, load_json_files, compact_snapshots, get_characters, get_timestamps_for_char,
+    get_items_at_timestamp, diff_snapshots, aggregate_items, snapshot_cache,
+)
+from ItemCompareGen import generate_reports
+
+def add_alts(paths, folder, rng, count):
+    # Copies of some reports under another character, so identical snapshots are
+    # shared across characters as well as within one
+    alts = []
+    for path in rng.sample(paths, min(count, len(paths))):
+        with open(path) as f:
+            data = json.load(f)
+        data["Character"] = "Alt"
+        alt_path = os.path.join(folder, "Alt" + os.path.basename(path)[os.path.basename(path).index("_items_"):])
+        with open(alt_path, "w") as f:
+            json.dump(data, f)
+        alts.append(alt_path)
+    return paths + alts
+
+def report_contents(path):
+    with open(path) as f:
+        data = json.load(f)
+    items = {name: info["qty"] for name, info in aggregate_items(data).items() if info["qty"]}
+    return (data["Character"], data["Timestamp"]), items
+
+def check(conn, truth, rng, pairs, label):
+    # Compares stored contents and a sample of diffs with the reports; returns the mismatches
+    snapshot_cache.discard(lambda key: True)
+    errors = []
+    for (char, ts), items in truth.items():
+        if get_items_at_timestamp(conn, char, ts) != items:
+            errors.append(f"{label}: contents of {char} {ts}")
+    for char in get_characters(conn):
+        timestamps = get_timestamps_for_char(conn, char)
+        if sorted(timestamps) != sorted(ts for c, ts in truth if c == char):
+            errors.append(f"{label}: snapshot list of {char}")
+            continue
+        for _ in range(pairs):
+            ref_ts, comp_ts = rng.choice(timestamps), rng.choice(timestamps)
+            ref, comp = truth[(char, ref_ts)], truth[(char, comp_ts)]
+            expected = {name: comp.get(name, 0) - ref.get(name, 0) for name in set(ref) | set(comp)}
+            expected = {name: delta for name, delta in expected.items() if delta}
+            got = {row[0]: row[1] for row in diff_snapshots(conn, char, ref_ts, comp_ts)}
+            if got != expected:
+                errors.append(f"{label}: diff of {char} {ref_ts} -> {comp_ts}")
+    return errors
+
+def run_seed(seed, workdir, args):
+    # Ingests the reports in shuffled batches, compacting with a random keyframe interval
+    # between some of them, then expands and compacts everything once more
+    rng = random.Random(seed)
+    reports = os.path.join(workdir, f"reports-{seed}")
+    folder = os.path.join(workdir, f"ingest-{seed}")
+    os.makedirs(folder)
+    paths = generate_reports(reports, args.characters, args.snapshots, args.items, churn=0.1,
+                             unchanged=0.3, seed=seed)
+    paths = add_alts(paths, reports, rng, args.snapshots // 2)
+    rng.shuffle(paths)
+    conn = init_db(os.path.join(workdir, f"check-{seed}.db"))
+    truth = {}
+    errors = []
+    batches = max(1, rng.randint(1, args.batches))
+    for batch in range(batches):
+        for path in paths[batch::batches]:
+            shutil.copy(path, folder)
+            key, items = report_contents(path)
+            truth[key] = items
+        core.report_indexes.clear()
+        load_json_files(folder, conn)
+        errors += check(conn, truth, rng, args.pairs, f"seed {seed} batch {batch}")
+        if rng.random() < 0.7:
+            interval = rng.choice([2, 3, 5, 20])
+            compact_snapshots(conn, interval)
+            errors += check(conn, truth, rng, args.pairs, f"seed {seed} batch {batch} compact {interval}")
+    compact_snapshots(conn, 1)
+    errors += check(conn, truth, rng, args.pairs, f"seed {seed} expanded")
+    interval = rng.choice([2, 3, 5])
+    compact_snapshots(conn, interval)
+    errors += check(conn, truth, rng, args.pairs, f"seed {seed} compact {interval}")
+    conn.close()
+    return errors
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Check stored snapshots and diffs against the source reports across "
+                    "out-of-order ingests, deduplication and compaction")
+    parser.add_argument("--seeds", type=int, default=20, help="random datasets to check")
+    parser.add_argument("--first-seed", type=int, default=1)
+    parser.add_argument("--characters", type=int, default=2)
+    parser.add_argument("--snapshots", type=int, default=12, help="reports per character")
+    parser.add_argument("--items", type=int, default=150)
+    parser.add_argument("--batches", type=int, default=4, help="most ingest batches per dataset")
+    parser.add_argument("--pairs", type=int, default=10, help="diffs checked per character each time")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="itemcompare-check-")
+    errors = []
+    try:
+        for seed in range(args.first_seed, args.first_seed + args.seeds):
+            errors += run_seed(seed, workdir, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    for error in errors:
+        sys.stdout.write(f"MISMATCH {error}\n")
+    sys.stdout.write(f"{args.seeds} datasets checked, {len(errors)} mismatches\n")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1307 @@
+import os
+import json
+import time
+import hashlib
+import itertools
+import calendar
+import bisect
+import sqlite3
+import logging
+import logging.handlers
+import cProfile
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DB_FILE = "inventory.db"
+BULK_BATCH_ROWS = 50000
+BULK_CHUNK_FILES = 16
+KEYFRAME_INTERVAL = 20
+# Stored in PRAGMA user_version once init_db has backfilled deltas, totals and hashes
+SCHEMA_VERSION = 1
+CACHE_SIZE = 64
+LOG_FILE = "ItemCompare.log"
+PROFILE_ENV = "ITEMCOMPARE_PROFILE"
+
+log = logging.getLogger("ItemCompare")
+
+class Timing:
+    # Wall time and row counts per stage of one operation, such as an ingest or a
+    # comparison. A stage can run many times, e.g. once per file; its times and rows add up.
+    def __init__(self, operation):
+        self.operation = operation
+        self.stages = {}
+        self.start = time.perf_counter()
+        self.total = None
+        self.outcome = None
+
+    def add(self, name, seconds, rows=0):
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "rows": 0})
+        stage["seconds"] += seconds
+        stage["rows"] += rows
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        # Yields a dict whose "rows" the caller can set once it knows the count
+        record = {"rows": rows}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add(name, time.perf_counter() - start, record["rows"])
+
+    def finish(self, outcome=None):
+        # outcome marks an operation that failed or had nothing to do
+        self.total = time.perf_counter() - self.start
+        self.outcome = outcome
+        text = self.summary()
+        log.info(text)
+        return text
+
+    def summary(self):
+        parts = []
+        for name, stage in self.stages.items():
+            rows = f" ({stage['rows']:,})" if stage["rows"] else ""
+            parts.append(f"{name} {stage['seconds'] * 1000:.1f} ms{rows}")
+        total = self.total if self.total is not None else time.perf_counter() - self.start
+        outcome = f" ({self.outcome})" if self.outcome else ""
+        return f"{self.operation}{outcome} {total * 1000:.1f} ms: " + ", ".join(parts)
+
+def setup_logging(log_file=None):
+    handler = logging.handlers.RotatingFileHandler(log_file or LOG_FILE, maxBytes=1024 * 1024, backupCount=3)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+def run_profiled(fn, suffix=""):
+    # With ITEMCOMPARE_PROFILE=<file> set, runs fn under cProfile and writes the stats to
+    # <file><suffix> when it returns. cProfile only sees the thread it was started on.
+    path = os.environ.get(PROFILE_ENV)
+    if not path:
+        return fn()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path + suffix)
+        log.info("profile written to %s", path + suffix)
+
+class SnapshotCache:
+    # Bounded LRU of snapshot contents, diffs and summaries, shared by the UI and
+    # worker threads. Keys are (kind, character, ...), so a new snapshot only drops
+    # its own character's entries.
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.db_file = None
+
+    def bind(self, db_file):
+        # Entries belong to one database; opening another starts over
+        with self.lock:
+            if db_file != self.db_file:
+                self.entries.clear()
+                self.generation += 1
+                self.db_file = db_file
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            generation = self.generation
+        value = compute()
+        with self.lock:
+            # Don't store a value computed from data invalidated in the meantime
+            if generation == self.generation:
+                self.entries[key] = value
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return value
+
+    def discard(self, match):
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                del self.entries[key]
+            self.generation += 1
+
+    def invalidate(self, character):
+        self.discard(lambda key: key[1] == character)
+
+    def invalidate_metadata(self):
+        # Diffs and summaries carry item rarity and value; snapshot contents don't
+        self.discard(lambda key: key[0] != "items")
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize}
+
+snapshot_cache = SnapshotCache()
+
+def init_db(db_file=None):
+    snapshot_cache.bind(os.path.abspath(db_file or DB_FILE))
+    snapshot_index.bind(os.path.abspath(db_file or DB_FILE))
+    conn = sqlite3.connect(db_file or DB_FILE)
+    # WAL lets the UI read while the background worker writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS characters (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY,
+            character_id INTEGER NOT NULL REFERENCES characters(id),
+            timestamp TEXT NOT NULL,
+            epoch INTEGER,
+            content_hash TEXT,
+            data_id INTEGER REFERENCES snapshots(id),
+            compacted INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (character_id, timestamp)
+        )
+    ''')
+    # content_hash identifies a snapshot's item quantities. A snapshot with data_id set
+    # has no rows of its own and shares that snapshot's contents; a compacted one is
+    # rebuilt from snapshot_deltas (see snapshot_source).
+    for column in ["content_hash TEXT", "data_id INTEGER REFERENCES snapshots(id)",
+                   "compacted INTEGER NOT NULL DEFAULT 0"]:
+        try:
+            cursor.execute(f"ALTER TABLE snapshots ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass
+    cursor.execute("CREATE INDEX IF NOT EXISTS snapshots_content ON snapshots (content_hash)")
+    # rarity/value come from the newest snapshot (by timestamp) that contained the item
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            rarity TEXT,
+            value INTEGER,
+            meta_timestamp TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_items (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+            item_id INTEGER NOT NULL REFERENCES items(id),
+            qty INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_id, item_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='inventories'")
+    if cursor.fetchone():
+        # Try to add missing columns if upgrading an older DB
+        try:
+            cursor.execute("ALTER TABLE inventories ADD COLUMN rarity TEXT")
+        except sqlite3.OperationalError:
+            pass
+        try:
+            cursor.execute("ALTER TABLE inventories ADD COLUMN value INTEGER")
+        except sqlite3.OperationalError:
+            pass
+        migrate_inventories(conn)
+        version = 0
+    # Change of each item against the character's previous snapshot
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_deltas (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+            item_id INTEGER NOT NULL REFERENCES items(id),
+            delta INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_id, item_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS snapshot_deltas_item ON snapshot_deltas (item_id, snapshot_id)")
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS item_history AS
+        SELECT c.name AS character, it.name AS item_name, s.timestamp, s.epoch, d.delta
+        FROM snapshot_deltas d
+        JOIN snapshots s ON s.id = d.snapshot_id
+        JOIN characters c ON c.id = s.character_id
+        JOIN items it ON it.id = d.item_id
+    ''')
+    # Per-snapshot quantity and value for each Summary category (see item_category)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_totals (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+            category TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            value INTEGER,
+            PRIMARY KEY (snapshot_id, category)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS net_worth_history AS
+        SELECT c.name AS character, s.timestamp, s.epoch, SUM(t.qty) AS items, COALESCE(SUM(t.value), 0) AS net_worth
+        FROM snapshot_totals t
+        JOIN snapshots s ON s.id = t.snapshot_id
+        JOIN characters c ON c.id = s.character_id
+        GROUP BY t.snapshot_id
+    ''')
+    # Serves the newest-first timestamp list for a character without a sort
+    cursor.execute("CREATE INDEX IF NOT EXISTS snapshots_char_epoch ON snapshots (character_id, epoch, timestamp)")
+    # Manifest of report files already ingested, used to skip unchanged files
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingested_files (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime INTEGER,
+            sha1 TEXT
+        )
+    ''')
+    # Backfill databases written before these tables and columns existed, once; an
+    # empty snapshot_totals is normal when reports carry no rarity or value
+    if version < SCHEMA_VERSION:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM snapshots) AND NOT EXISTS (SELECT 1 FROM snapshot_deltas)")
+        if cursor.fetchone()[0]:
+            rebuild_deltas(cursor)
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM snapshots) AND NOT EXISTS (SELECT 1 FROM snapshot_totals)")
+        if cursor.fetchone()[0]:
+            rebuild_totals(cursor)
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM snapshots WHERE content_hash IS NULL AND data_id IS NULL AND compacted = 0)")
+        if cursor.fetchone()[0]:
+            rebuild_hashes(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    return conn
+
+def migrate_inventories(conn):
+    # Move rows from the old flat inventories table into the normalized tables
+    cursor = conn.cursor()
+    cursor.execute("CREATE INDEX IF NOT EXISTS inventories_item_ts ON inventories (item_name, timestamp)")
+    cursor.execute("INSERT OR IGNORE INTO characters (name) SELECT DISTINCT character FROM inventories")
+    cursor.execute('''
+        INSERT OR IGNORE INTO snapshots (character_id, timestamp)
+        SELECT DISTINCT c.id, i.timestamp FROM inventories i JOIN characters c ON c.name = i.character
+    ''')
+    cursor.execute("SELECT id, timestamp FROM snapshots WHERE epoch IS NULL")
+    cursor.executemany("UPDATE snapshots SET epoch=? WHERE id=?",
+                       [(timestamp_to_epoch(ts), snap_id) for snap_id, ts in cursor.fetchall()])
+    cursor.execute("INSERT OR IGNORE INTO items (name) SELECT DISTINCT item_name FROM inventories")
+    cursor.execute('''
+        UPDATE items SET (rarity, value, meta_timestamp) = (
+            SELECT i.rarity, i.value, i.timestamp FROM inventories i
+            WHERE i.item_name = items.name ORDER BY i.timestamp DESC LIMIT 1
+        ) WHERE meta_timestamp IS NULL
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO snapshot_items (snapshot_id, item_id, qty)
+        SELECT s.id, it.id, i.quantity FROM inventories i
+        JOIN characters c ON c.name = i.character
+        JOIN snapshots s ON s.character_id = c.id AND s.timestamp = i.timestamp
+        JOIN items it ON it.name = i.item_name
+    ''')
+    cursor.execute("DROP TABLE inventories")
+    conn.commit()
+    conn.execute("VACUUM")
+
+def parse_timestamp(ts_str):
+    try:
+        return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%SZ")
+    except ValueError:
+        return None
+
+def timestamp_to_epoch(ts_str):
+    dt = parse_timestamp(ts_str)
+    if dt is None:
+        return None
+    return calendar.timegm(dt.timetuple())
+
+def parse_filename_date(filename):
+    match = re.search(r'(\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}Z)', filename)
+    if match:
+        date_str = match.group(1)
+        try:
+            return datetime.strptime(date_str, "%Y-%m-%d-%H-%M-%SZ")
+        except ValueError:
+            return None
+    return None
+
+def report_value(value):
+    # Values written as numeric strings are read as numbers, the way the INTEGER column
+    # used to store them; anything else raises
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+    if value is not None and not isinstance(value, (int, float)):
+        raise TypeError(f"bad item value {value!r}")
+    return value
+
+def aggregate_items(data):
+    item_dict = {}
+    for item in data.get("Items", []):
+        name = item.get("Name")
+        stack = item.get("StackSize", 1)
+        rarity = item.get("Rarity")
+        value = report_value(item.get("Value"))
+        if name:
+            if name not in item_dict:
+                item_dict[name] = {"qty": 0, "rarity": rarity, "value": value}
+            item_dict[name]["qty"] += stack
+    return item_dict
+
+class ItemDictionary:
+    # In-memory copy of the items table so ingest can intern names without a query per item
+    def __init__(self, cursor):
+        cursor.execute("SELECT name, id, rarity, value, meta_timestamp FROM items")
+        self.items = {row[0]: list(row[1:]) for row in cursor.fetchall()}
+        self.dirty = set()
+        self.meta_changed = False
+
+    def intern(self, cursor, name, rarity, value, timestamp):
+        entry = self.items.get(name)
+        if entry is None:
+            cursor.execute("INSERT INTO items (name, rarity, value, meta_timestamp) VALUES (?, ?, ?, ?)",
+                           (name, rarity, value, timestamp))
+            self.items[name] = [cursor.lastrowid, rarity, value, timestamp]
+            return cursor.lastrowid
+        if entry[3] is None or timestamp >= entry[3]:
+            if entry[1:3] != [rarity, value]:
+                self.meta_changed = True
+            entry[1:] = [rarity, value, timestamp]
+            self.dirty.add(name)
+        return entry[0]
+
+    def flush(self, cursor):
+        cursor.executemany(
+            "UPDATE items SET rarity=?, value=?, meta_timestamp=? WHERE id=?",
+            [(e[1], e[2], e[3], e[0]) for e in (self.items[name] for name in self.dirty)]
+        )
+        self.dirty.clear()
+        if self.meta_changed:
+            snapshot_cache.invalidate_metadata()
+            self.meta_changed = False
+
+def get_character_id(cursor, name):
+    cursor.execute("INSERT OR IGNORE INTO characters (name) VALUES (?)", (name,))
+    cursor.execute("SELECT id FROM characters WHERE name=?", (name,))
+    return cursor.fetchone()[0]
+
+def snapshot_exists(cursor, character, timestamp):
+    cursor.execute('''
+        SELECT 1 FROM snapshots s JOIN characters c ON c.id = s.character_id
+        WHERE c.name=? AND s.timestamp=?
+    ''', (character, timestamp))
+    return cursor.fetchone() is not None
+
+def snapshot_hash(rows):
+    # rows are (item_id, qty) pairs in any order
+    return hashlib.sha1(json.dumps(sorted(rows)).encode()).hexdigest()
+
+def store_snapshot(cursor, items, character, timestamp, item_dict):
+    rows = [(items.intern(cursor, name, info["rarity"], info["value"], timestamp), info["qty"])
+            for name, info in item_dict.items()]
+    content_hash = snapshot_hash(rows)
+    # A report identical to one already stored only references it
+    cursor.execute("SELECT COALESCE(data_id, id) FROM snapshots WHERE content_hash=? ORDER BY compacted LIMIT 1",
+                   (content_hash,))
+    row = cursor.fetchone()
+    data_id = row[0] if row else None
+    epoch = timestamp_to_epoch(timestamp)
+    cursor.execute(
+        "INSERT INTO snapshots (character_id, timestamp, epoch, content_hash, data_id) VALUES (?, ?, ?, ?, ?)",
+        (get_character_id(cursor, character), timestamp, epoch, content_hash, data_id)
+    )
+    snapshot_id = cursor.lastrowid
+    snapshot_index.add(character, timestamp, epoch, snapshot_id)
+    if data_id is None:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO snapshot_items VALUES (?, ?, ?)",
+            [(snapshot_id, item_id, qty) for item_id, qty in rows]
+        )
+    cursor.executemany(
+        "INSERT INTO snapshot_totals VALUES (?, ?, ?, ?)",
+        [(snapshot_id, category, qty, value) for category, (qty, value) in category_totals(item_dict).items()]
+    )
+    link_snapshot(cursor, snapshot_id)
+    return snapshot_id
+
+def commit_snapshots(conn):
+    # Stored snapshots only reach the index, and drop their character's cache
+    # entries, once the transaction holding them has committed
+    conn.commit()
+    for character in snapshot_index.commit():
+        snapshot_cache.invalidate(character)
+
+def item_category(rarity, value):
+    # The Summary tab's grouping: rarity gear, then misc items split at a value of 1k
+    if rarity:
+        return rarity
+    if value is None:
+        return None
+    return "Misc over 1k" if value >= 1000 else "Misc under 1k"
+
+def category_totals(item_dict):
+    # Uses the rarity and value recorded in the report itself
+    totals = {}
+    for info in item_dict.values():
+        category = item_category(info["rarity"], info["value"])
+        if category is None:
+            continue
+        qty, value = totals.get(category, (0, None))
+        if info["value"] is not None:
+            value = (value or 0) + info["value"] * info["qty"]
+        totals[category] = (qty + info["qty"], value)
+    return totals
+
+def rebuild_totals(cursor):
+    # Older snapshots have no per-report values left, so the current item metadata is used
+    cursor.execute("DELETE FROM snapshot_totals")
+    cursor.execute('''
+        INSERT INTO snapshot_totals
+        SELECT si.snapshot_id,
+               CASE WHEN it.rarity IS NOT NULL AND it.rarity != '' THEN it.rarity
+                    WHEN it.value >= 1000 THEN 'Misc over 1k' ELSE 'Misc under 1k' END,
+               SUM(si.qty), SUM(si.qty * it.value)
+        FROM snapshot_items si JOIN items it ON it.id = si.item_id
+        WHERE (it.rarity IS NOT NULL AND it.rarity != '') OR it.value IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+
+def rebuild_hashes(cursor):
+    cursor.execute("SELECT id FROM snapshots WHERE content_hash IS NULL AND data_id IS NULL AND compacted = 0")
+    hashes = {row[0]: snapshot_hash([]) for row in cursor.fetchall()}
+    cursor.execute('''
+        SELECT snapshot_id, item_id, qty FROM snapshot_items
+        WHERE snapshot_id IN (SELECT value FROM json_each(?)) ORDER BY snapshot_id
+    ''', (json.dumps(list(hashes)),))
+    for snapshot_id, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+        hashes[snapshot_id] = snapshot_hash([row[1:] for row in rows])
+    cursor.executemany("UPDATE snapshots SET content_hash=? WHERE id=?",
+                       [(content_hash, snapshot_id) for snapshot_id, content_hash in hashes.items()])
+
+def record_file(cursor, filepath, st, digest):
+    cursor.execute(
+        "INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?, ?)",
+        (filepath, st.st_size, st.st_mtime_ns, digest)
+    )
+
+def parse_report(filepath, known_digest=None):
+    # Runs in worker processes during bulk imports, so it must not touch the DB
+    try:
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return "failed", None, None, None, None
+    digest = hashlib.sha1(raw).hexdigest()
+    if digest == known_digest:
+        return "unchanged", digest, None, None, None
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return "failed", digest, None, None, None
+    if not isinstance(data, dict):
+        return "failed", digest, None, None, None
+    character = data.get("Character")
+    timestamp = data.get("Timestamp")
+    if not (character and timestamp):
+        return "failed", digest, None, None, None
+    try:
+        item_dict = aggregate_items(data)
+    except (AttributeError, TypeError, ValueError):
+        # Items that aren't a list of objects, or a non-numeric StackSize or Value
+        return "failed", digest, None, None, None
+    return "parsed", digest, character, timestamp, item_dict
+
+def load_json_files(folder, conn, bulk=False, workers=None, progress=None, cancel=None, timing=None):
+    # progress(done, total) is called before each file that needs parsing; setting
+    # the cancel event stops the load after the file in progress. Stage times go to
+    # timing if given, otherwise to the log.
+    own_timing = timing is None
+    if own_timing:
+        timing = Timing("ingest")
+    cursor = conn.cursor()
+    counts = {"ingested": 0, "skipped": 0, "failed": 0, "cancelled": False}
+    pending = []
+    with timing.stage("scan") as stage:
+        cursor.execute("SELECT path, size, mtime, sha1 FROM ingested_files")
+        manifest = {row[0]: row[1:] for row in cursor.fetchall()}
+        files = get_report_index(folder).files
+        for filepath in files:
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                counts["failed"] += 1
+                continue
+            known = manifest.get(filepath)
+            # Unchanged size and mtime means the file was already ingested
+            if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+                counts["skipped"] += 1
+                continue
+            pending.append((filepath, st, known[2] if known else None))
+        stage["rows"] = len(files)
+
+    if bulk:
+        bulk_import(conn, pending, counts, workers, progress, cancel, timing)
+    else:
+        items = ItemDictionary(cursor)
+        for done, (filepath, st, known_digest) in enumerate(pending):
+            if cancel is not None and cancel.is_set():
+                counts["cancelled"] = True
+                break
+            if progress:
+                progress(done, len(pending))
+            with timing.stage("parse", rows=1):
+                status, digest, character, timestamp, item_dict = parse_report(filepath, known_digest)
+            if status == "failed":
+                counts["failed"] += 1
+                continue
+            with timing.stage("write") as stage:
+                if status == "parsed":
+                    if snapshot_exists(cursor, character, timestamp):
+                        counts["skipped"] += 1
+                    else:
+                        store_snapshot(cursor, items, character, timestamp, item_dict)
+                        items.flush(cursor)
+                        stage["rows"] = len(item_dict)
+                        counts["ingested"] += 1
+                else:
+                    # Touched but not modified, just refresh the manifest entry
+                    counts["skipped"] += 1
+                record_file(cursor, filepath, st, digest)
+                commit_snapshots(conn)
+    if own_timing:
+        timing.finish()
+    return counts
+
+def parse_reports(paths, known_digests):
+    # One chunk of a bulk import, run in a worker process
+    return [parse_report(path, digest) for path, digest in zip(paths, known_digests)]
+
+def parse_in_order(pool, pending, chunksize, window):
+    # Yields parse_report results in pending order. At most window chunks are queued
+    # or held at once, so parsed reports don't pile up ahead of the writer.
+    futures = deque()
+    for start in range(0, len(pending), chunksize):
+        chunk = pending[start:start + chunksize]
+        futures.append(pool.submit(parse_reports, [p[0] for p in chunk], [p[2] for p in chunk]))
+        if len(futures) >= window:
+            yield from futures.popleft().result()
+    while futures:
+        yield from futures.popleft().result()
+
+def bulk_import(conn, pending, counts, workers=None, progress=None, cancel=None, timing=None):
+    # parse time here is time spent waiting on the worker processes
+    if not pending:
+        return
+    timing = timing or Timing("bulk import")
+    cursor = conn.cursor()
+    cursor.execute("SELECT c.name, s.timestamp FROM snapshots s JOIN characters c ON c.id = s.character_id")
+    stored = set(cursor.fetchall())
+    items = ItemDictionary(cursor)
+    file_rows = []
+    batch_rows = 0
+
+    def flush():
+        with timing.stage("write"):
+            items.flush(cursor)
+            cursor.executemany("INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?, ?)", file_rows)
+            commit_snapshots(conn)
+        file_rows.clear()
+
+    processes = workers or os.cpu_count() or 1
+    chunksize = max(1, min(BULK_CHUNK_FILES, len(pending) // (processes * 4)))
+    # Workers parse and aggregate; this thread is the only writer. Results come back
+    # in folder order so duplicate snapshots resolve the same way as a serial load.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = parse_in_order(pool, pending, chunksize, processes * 2)
+        for done, (filepath, st, _) in enumerate(pending):
+            if cancel is not None and cancel.is_set():
+                counts["cancelled"] = True
+                pool.shutdown(wait=False, cancel_futures=True)
+                break
+            if progress:
+                progress(done, len(pending))
+            with timing.stage("parse", rows=1):
+                status, digest, character, timestamp, item_dict = next(results)
+            if status == "failed":
+                counts["failed"] += 1
+                continue
+            if status == "parsed" and (character, timestamp) not in stored:
+                stored.add((character, timestamp))
+                with timing.stage("write", rows=len(item_dict)):
+                    store_snapshot(cursor, items, character, timestamp, item_dict)
+                batch_rows += len(item_dict)
+                counts["ingested"] += 1
+            else:
+                counts["skipped"] += 1
+            file_rows.append((filepath, st.st_size, st.st_mtime_ns, digest))
+            if batch_rows >= BULK_BATCH_ROWS:
+                flush()
+                batch_rows = 0
+    flush()
+
+def get_characters(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM characters ORDER BY name")
+    return [row[0] for row in cursor.fetchall()]
+
+def get_timestamps_for_char(conn, char):
+    return snapshot_index.timestamps(conn, char)
+
+def get_later_timestamps(conn, char, ts):
+    # Timestamps after ts, newest first: the "Compare To" choices for reference ts
+    return snapshot_index.later(conn, char, ts)
+
+def get_latest_timestamp(conn, char):
+    return snapshot_index.latest(conn, char)
+
+NO_EPOCH = float("-inf")
+
+class SnapshotIndex:
+    # Every character's snapshots as (epoch, timestamp) keys sorted oldest first, with
+    # their ids alongside, so lookups are bisects. store_snapshot queues new snapshots
+    # that commit() adds once they are committed, rollback() drops them, and it reloads
+    # when another connection has added snapshots. Snapshots with no epoch sort first,
+    # the way SQLite orders NULL.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chars = None
+        self.last_id = None
+        self.pending = []
+        self.db_file = None
+
+    def bind(self, db_file):
+        with self.lock:
+            if db_file != self.db_file:
+                self.chars = None
+                self.pending = []
+                self.db_file = db_file
+
+    def load(self, conn, char):
+        # Called with the lock held; returns the character's (keys, ids)
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(id) FROM snapshots")
+        last_id = cursor.fetchone()[0] or 0
+        if self.chars is None or last_id > self.last_id:
+            cursor.execute('''
+                SELECT c.name, s.epoch, s.timestamp, s.id FROM snapshots s JOIN characters c ON c.id = s.character_id
+                ORDER BY c.name, s.epoch, s.timestamp
+            ''')
+            chars = {}
+            for name, epoch, timestamp, snapshot_id in cursor.fetchall():
+                keys, ids = chars.setdefault(name, ([], []))
+                keys.append((NO_EPOCH if epoch is None else epoch, timestamp))
+                ids.append(snapshot_id)
+            self.chars = chars
+            self.last_id = last_id
+            # Loaded on the writing connection, the reload already has them
+            self.pending = [entry for entry in self.pending if entry[3] > last_id]
+        return self.chars.get(char, ([], []))
+
+    def add(self, char, timestamp, epoch, snapshot_id):
+        with self.lock:
+            self.pending.append((char, timestamp, epoch, snapshot_id))
+
+    def commit(self):
+        # Returns the characters that gained snapshots
+        with self.lock:
+            pending, self.pending = self.pending, []
+            if self.chars is not None:
+                for char, timestamp, epoch, snapshot_id in pending:
+                    keys, ids = self.chars.setdefault(char, ([], []))
+                    key = (NO_EPOCH if epoch is None else epoch, timestamp)
+                    pos = bisect.bisect_right(keys, key)
+                    keys.insert(pos, key)
+                    ids.insert(pos, snapshot_id)
+                    self.last_id = max(self.last_id, snapshot_id)
+            return {entry[0] for entry in pending}
+
+    def rollback(self):
+        # SQLite reuses rolled-back rowids, so MAX(id) can't tell the index is stale
+        with self.lock:
+            self.pending = []
+            self.chars = None
+
+    def timestamps(self, conn, char):
+        with self.lock:
+            keys, _ = self.load(conn, char)
+            return [ts for _, ts in reversed(keys)]
+
+    def later(self, conn, char, ts):
+        epoch = timestamp_to_epoch(ts)
+        if epoch is None:
+            return []
+        with self.lock:
+            keys, _ = self.load(conn, char)
+            # Epochs are whole seconds, so (epoch + 1,) sorts before every later key
+            pos = bisect.bisect_left(keys, (epoch + 1,))
+            return [ts for _, ts in reversed(keys[pos:])]
+
+    def latest(self, conn, char):
+        with self.lock:
+            keys, _ = self.load(conn, char)
+            return keys[-1][1] if keys else None
+
+    def closest(self, conn, char, epoch):
+        # (snapshot_id, timestamp) nearest epoch, ties going to the earlier one
+        with self.lock:
+            keys, ids = self.load(conn, char)
+            pos = bisect.bisect_left(keys, (epoch,))
+            best = None
+            if pos > 0 and keys[pos - 1][0] != NO_EPOCH:
+                best = pos - 1
+            if pos < len(keys) and (best is None or keys[pos][0] - epoch < epoch - keys[best][0]):
+                best = pos
+            return None if best is None else (ids[best], keys[best][1])
+
+snapshot_index = SnapshotIndex()
+
+class ReportIndex:
+    # Report files in one folder, grouped by character and sorted by the timestamp
+    # in the filename. The folder is only rescanned when its mtime changes.
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        self.mtime = None
+        self.files = []
+        self.by_char = {}
+
+    def refresh(self):
+        mtime = os.stat(self.folder).st_mtime_ns
+        if mtime == self.mtime:
+            return
+        files = []
+        by_char = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                filename = entry.name
+                if not (filename.endswith(".json") and "_items_" in filename):
+                    continue
+                files.append(entry.path)
+                file_date = parse_filename_date(filename)
+                if file_date:
+                    char = filename.split("_items_", 1)[0]
+                    by_char.setdefault(char, []).append((file_date, entry.path))
+        for reports in by_char.values():
+            reports.sort()
+        self.files = files
+        self.by_char = by_char
+        self.mtime = mtime
+
+    def latest(self, char):
+        reports = self.by_char.get(char)
+        return reports[-1][1] if reports else None
+
+report_indexes = {}
+
+def get_report_index(folder):
+    key = os.path.abspath(folder)
+    index = report_indexes.get(key)
+    if index is None:
+        index = report_indexes[key] = ReportIndex(key)
+    index.refresh()
+    return index
+
+def get_latest_file_for_char(folder, char):
+    return get_report_index(folder).latest(char)
+
+def load_latest_if_new(folder, conn, char):
+    latest_file = get_latest_file_for_char(folder, char)
+    if latest_file:
+        filepath = os.path.abspath(latest_file)
+        st = os.stat(filepath)
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw)
+        timestamp = data.get("Timestamp")
+        cursor = conn.cursor()
+        new_snapshot = not snapshot_exists(cursor, char, timestamp)
+        if new_snapshot:
+            items = ItemDictionary(cursor)
+            store_snapshot(cursor, items, char, timestamp, aggregate_items(data))
+            items.flush(cursor)
+        record_file(cursor, filepath, st, hashlib.sha1(raw).hexdigest())
+        commit_snapshots(conn)
+        if new_snapshot:
+            return timestamp
+    return None
+
+def get_snapshot_id(conn, char, ts):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT s.id FROM snapshots s JOIN characters c ON c.id = s.character_id
+        WHERE c.name=? AND s.timestamp=?
+    ''', (char, ts))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def get_items_at_timestamp(conn, char, ts):
+    def load():
+        cursor = conn.cursor()
+        base_id, delta_ids = snapshot_source(cursor, get_snapshot_id(conn, char, ts))
+        cursor.execute(f'''
+            SELECT it.name, c.qty FROM ({CONTENTS_SQL}) c JOIN items it ON it.id = c.item_id
+        ''', {"base": base_id, "deltas": json.dumps(delta_ids)})
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    return snapshot_cache.get(("items", char, ts), load)
+
+def snapshot_source(cursor, snapshot_id):
+    # (base_id, delta_ids): the snapshot's contents are base_id's snapshot_items rows
+    # plus the snapshot_deltas of delta_ids. References to identical snapshots are
+    # followed, and a compacted snapshot adds up the deltas back to the nearest
+    # snapshot with rows of its own. Referencing snapshots on the way count as deltas
+    # too, since the snapshot they reference may itself be rebuilt through them.
+    # base_id None means no rows, as for a character's first snapshot, whose delta
+    # is its full contents.
+    delta_ids = []
+    while snapshot_id is not None:
+        cursor.execute("SELECT data_id, compacted, character_id, epoch, timestamp FROM snapshots WHERE id=?",
+                       (snapshot_id,))
+        data_id, compacted, char_id, epoch, timestamp = cursor.fetchone()
+        if data_id is not None:
+            snapshot_id = data_id
+        elif not compacted:
+            break
+        else:
+            cursor.execute('''
+                SELECT id, data_id, compacted FROM snapshots
+                WHERE character_id=? AND (epoch < ? OR (epoch = ? AND timestamp <= ?))
+                ORDER BY epoch DESC, timestamp DESC
+            ''', (char_id, epoch, epoch, timestamp))
+            snapshot_id = None
+            for earlier_id, earlier_data_id, earlier_compacted in cursor:
+                if earlier_data_id is None and not earlier_compacted:
+                    snapshot_id = earlier_id
+                    break
+                delta_ids.append(earlier_id)
+    return snapshot_id, delta_ids
+
+# Non-zero (item_id, qty) contents of a snapshot, given snapshot_source's result
+CONTENTS_SQL = '''
+    SELECT item_id, SUM(qty) AS qty FROM (
+        SELECT item_id, qty FROM snapshot_items WHERE snapshot_id=:base
+        UNION ALL
+        SELECT item_id, delta FROM snapshot_deltas WHERE snapshot_id IN (SELECT value FROM json_each(:deltas))
+    ) GROUP BY item_id HAVING SUM(qty) != 0
+'''
+
+# Non-zero (item_id, delta) pairs between two stored snapshots: comp minus ref
+DIFF_ITEM_IDS_SQL = '''
+    SELECT item_id, SUM(qty) AS delta FROM (
+        SELECT item_id, qty FROM snapshot_items WHERE snapshot_id=:comp
+        UNION ALL
+        SELECT item_id, delta FROM snapshot_deltas WHERE snapshot_id IN (SELECT value FROM json_each(:comp_deltas))
+        UNION ALL
+        SELECT item_id, -qty FROM snapshot_items WHERE snapshot_id=:ref
+        UNION ALL
+        SELECT item_id, -delta FROM snapshot_deltas WHERE snapshot_id IN (SELECT value FROM json_each(:ref_deltas))
+    ) GROUP BY item_id HAVING SUM(qty) != 0
+'''
+
+def diff_params(cursor, ref_id, comp_id):
+    # DIFF_ITEM_IDS_SQL parameters. Whatever the two snapshots share cancels out, so
+    # two compacted snapshots on the same keyframe only read the deltas between them.
+    ref_base, ref_deltas = snapshot_source(cursor, ref_id)
+    comp_base, comp_deltas = snapshot_source(cursor, comp_id)
+    if ref_base == comp_base:
+        ref_base = comp_base = None
+    shared = set(ref_deltas) & set(comp_deltas)
+    return {"ref": ref_base, "ref_deltas": json.dumps([i for i in ref_deltas if i not in shared]),
+            "comp": comp_base, "comp_deltas": json.dumps([i for i in comp_deltas if i not in shared])}
+
+def diff_snapshot_ids(conn, ref_id, comp_id, stream=False):
+    cursor = conn.cursor()
+    params = diff_params(cursor, ref_id, comp_id)
+    cursor.execute(f'''
+        SELECT it.name, d.delta, it.rarity, it.value
+        FROM ({DIFF_ITEM_IDS_SQL}) d JOIN items it ON it.id = d.item_id
+    ''', params)
+    # A streamed cursor yields (name, delta, rarity, value) rows as SQLite produces them
+    if stream:
+        return cursor
+    return cursor.fetchall()
+
+def diff_snapshots(conn, char, ref_ts, comp_ts, stream=False):
+    return diff_snapshot_ids(conn, get_snapshot_id(conn, char, ref_ts), get_snapshot_id(conn, char, comp_ts), stream)
+
+def store_deltas(cursor, snapshot_id, prev_id):
+    # With no previous snapshot the delta is the snapshot's full contents
+    params = diff_params(cursor, prev_id, snapshot_id)
+    params["id"] = snapshot_id
+    cursor.execute("DELETE FROM snapshot_deltas WHERE snapshot_id=?", (snapshot_id,))
+    cursor.execute(f"INSERT INTO snapshot_deltas SELECT :id, item_id, delta FROM ({DIFF_ITEM_IDS_SQL})", params)
+
+def rebase_deltas(cursor, snapshot_id, inserted_id):
+    # snapshot_id's delta was taken against the snapshot now before inserted_id, so
+    # taking away inserted_id's delta rebases it. Unlike store_deltas this doesn't read
+    # snapshot_id's contents, which for a compacted snapshot still depend on the old delta.
+    cursor.execute('''
+        SELECT item_id, SUM(delta) FROM (
+            SELECT item_id, delta FROM snapshot_deltas WHERE snapshot_id=:next
+            UNION ALL
+            SELECT item_id, -delta FROM snapshot_deltas WHERE snapshot_id=:inserted
+        ) GROUP BY item_id HAVING SUM(delta) != 0
+    ''', {"next": snapshot_id, "inserted": inserted_id})
+    rows = cursor.fetchall()
+    cursor.execute("DELETE FROM snapshot_deltas WHERE snapshot_id=?", (snapshot_id,))
+    cursor.executemany("INSERT INTO snapshot_deltas VALUES (?, ?, ?)", [(snapshot_id, item_id, delta) for item_id, delta in rows])
+
+def link_snapshot(cursor, snapshot_id):
+    # Snapshots can arrive out of order, so the following snapshot is rebased too
+    cursor.execute("SELECT character_id, epoch, timestamp FROM snapshots WHERE id=?", (snapshot_id,))
+    char_id, epoch, timestamp = cursor.fetchone()
+    if epoch is None:
+        return
+    cursor.execute('''
+        SELECT id FROM snapshots WHERE character_id=? AND (epoch < ? OR (epoch = ? AND timestamp < ?))
+        ORDER BY epoch DESC, timestamp DESC LIMIT 1
+    ''', (char_id, epoch, epoch, timestamp))
+    row = cursor.fetchone()
+    store_deltas(cursor, snapshot_id, row[0] if row else None)
+    cursor.execute('''
+        SELECT id FROM snapshots WHERE character_id=? AND (epoch > ? OR (epoch = ? AND timestamp > ?))
+        ORDER BY epoch, timestamp LIMIT 1
+    ''', (char_id, epoch, epoch, timestamp))
+    row = cursor.fetchone()
+    if row:
+        rebase_deltas(cursor, row[0], snapshot_id)
+
+def rebuild_deltas(cursor):
+    cursor.execute("DELETE FROM snapshot_deltas")
+    cursor.execute("SELECT id, character_id FROM snapshots WHERE epoch IS NOT NULL ORDER BY character_id, epoch, timestamp")
+    prev_id = None
+    prev_char = None
+    for snapshot_id, char_id in cursor.fetchall():
+        store_deltas(cursor, snapshot_id, prev_id if char_id == prev_char else None)
+        prev_id, prev_char = snapshot_id, char_id
+
+def dedupe_snapshots(cursor):
+    # Points snapshots stored before deduplication at the first identical one
+    cursor.execute("SELECT id, content_hash FROM snapshots WHERE data_id IS NULL AND compacted = 0 ORDER BY id")
+    first = {}
+    duplicates = []
+    for snapshot_id, content_hash in cursor.fetchall():
+        if content_hash in first:
+            duplicates.append((first[content_hash], snapshot_id))
+        else:
+            first[content_hash] = snapshot_id
+    cursor.executemany("UPDATE snapshots SET data_id=? WHERE id=?", duplicates)
+    cursor.executemany("DELETE FROM snapshot_items WHERE snapshot_id=?", [(snapshot_id,) for _, snapshot_id in duplicates])
+    return len(duplicates)
+
+def compact_snapshots(conn, keyframe_interval=KEYFRAME_INTERVAL):
+    # Keeps full rows for every keyframe_interval-th snapshot of each character and for
+    # snapshots others reference; the rest are rebuilt from snapshot_deltas when read.
+    # An interval of 1 expands every snapshot again.
+    if keyframe_interval < 1:
+        raise ValueError(f"keyframe interval must be at least 1, not {keyframe_interval}")
+    cursor = conn.cursor()
+    deduplicated = dedupe_snapshots(cursor)
+    cursor.execute("SELECT DISTINCT data_id FROM snapshots WHERE data_id IS NOT NULL")
+    referenced = {row[0] for row in cursor.fetchall()}
+    cursor.execute('''
+        SELECT id, character_id, data_id, compacted FROM snapshots
+        WHERE epoch IS NOT NULL ORDER BY character_id, epoch, timestamp
+    ''')
+    expand = []
+    compact = []
+    position = 0
+    prev_char = None
+    for snapshot_id, char_id, data_id, compacted in cursor.fetchall():
+        position = position + 1 if char_id == prev_char else 0
+        prev_char = char_id
+        if data_id is not None:
+            continue
+        keyframe = position % keyframe_interval == 0 or snapshot_id in referenced
+        if keyframe and compacted:
+            expand.append(snapshot_id)
+        elif not keyframe and not compacted:
+            compact.append(snapshot_id)
+    # New keyframes get their rows before any other snapshot stops relying on its own
+    for snapshot_id in expand:
+        base_id, delta_ids = snapshot_source(cursor, snapshot_id)
+        cursor.execute(f"INSERT INTO snapshot_items SELECT :id, item_id, qty FROM ({CONTENTS_SQL})",
+                       {"id": snapshot_id, "base": base_id, "deltas": json.dumps(delta_ids)})
+        cursor.execute("UPDATE snapshots SET compacted=0 WHERE id=?", (snapshot_id,))
+    cursor.execute("DELETE FROM snapshot_items WHERE snapshot_id IN (SELECT value FROM json_each(?))", (json.dumps(compact),))
+    cursor.execute("UPDATE snapshots SET compacted=1 WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(compact),))
+    conn.commit()
+    conn.execute("VACUUM")
+    return {"deduplicated": deduplicated, "compacted": len(compact), "expanded": len(expand)}
+
+def get_item_timeline(conn, char, item_name):
+    # (timestamp, delta, quantity) for every snapshot where the item's quantity changed
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT timestamp, delta, SUM(delta) OVER (ORDER BY epoch, timestamp)
+        FROM item_history WHERE character=? AND item_name=?
+        ORDER BY epoch, timestamp
+    ''', (char, item_name))
+    return cursor.fetchall()
+
+def get_item_change(conn, char, item_name, start_ts, end_ts):
+    # Net change between the snapshots current at start_ts and at end_ts
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COALESCE(SUM(delta), 0) FROM item_history
+        WHERE character=? AND item_name=? AND epoch > ? AND epoch <= ?
+    ''', (char, item_name, timestamp_to_epoch(start_ts), timestamp_to_epoch(end_ts)))
+    return cursor.fetchone()[0]
+
+def summarize_changes(changes, item_meta):
+    # Gained items are broken down by rarity, or by value for items without one
+    gained = {name: d for name, d in changes.items() if d > 0}
+    lost = {name: -d for name, d in changes.items() if d < 0}
+
+    rarity_counts = {}
+    rarity_values = {}
+    misc_over_1k = 0
+    misc_under_1k = 0
+    misc_over_1k_value = 0
+    misc_under_1k_value = 0
+    phlogiston_prism_items = {}
+
+    # Calculate totals for gained items
+    for name, delta in gained.items():
+        rarity, value = item_meta.get(name, (None, None))
+
+        # Check for Phlogiston or Prism items
+        if "phlogiston" in name.lower() or "prism" in name.lower():
+            phlogiston_prism_items[name] = delta
+
+        if rarity:
+            rarity_counts[rarity] = rarity_counts.get(rarity, 0) + delta
+            if value is not None:
+                rarity_values[rarity] = rarity_values.get(rarity, 0) + (value * delta)
+        elif value is not None:
+            if value >= 1000:
+                misc_over_1k += delta
+                misc_over_1k_value += value * delta
+            else:
+                misc_under_1k += delta
+                misc_under_1k_value += value * delta
+
+    # Check lost items for Phlogiston/Prism
+    for name, delta in lost.items():
+        if "phlogiston" in name.lower() or "prism" in name.lower():
+            if name in phlogiston_prism_items:
+                phlogiston_prism_items[name] -= delta
+            else:
+                phlogiston_prism_items[name] = -delta
+
+    return {
+        "total_gained": sum(gained.values()),
+        "total_lost": sum(lost.values()),
+        "phlogiston_prism_items": phlogiston_prism_items,
+        "rarity_counts": rarity_counts,
+        "rarity_values": rarity_values,
+        "misc_over_1k": misc_over_1k,
+        "misc_under_1k": misc_under_1k,
+        "misc_over_1k_value": misc_over_1k_value,
+        "misc_under_1k_value": misc_under_1k_value,
+        "total_category_value": sum(rarity_values.values()) + misc_over_1k_value + misc_under_1k_value,
+    }
+
+def get_net_worth_history(conn, char):
+    # (timestamp, item count, total value) per snapshot, oldest first
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT timestamp, items, net_worth FROM net_worth_history
+        WHERE character=? ORDER BY epoch, timestamp
+    ''', (char,))
+    return cursor.fetchall()
+
+def totals_change(conn, ref_id, comp_id):
+    # {category: (qty change, value change)} from the stored totals of two snapshots
+    if ref_id == comp_id:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT category,
+               SUM(CASE WHEN snapshot_id = :comp THEN qty ELSE -qty END),
+               SUM(CASE WHEN snapshot_id = :comp THEN COALESCE(value, 0) ELSE -COALESCE(value, 0) END)
+        FROM snapshot_totals WHERE snapshot_id IN (:ref, :comp)
+        GROUP BY category
+    ''', {"ref": ref_id, "comp": comp_id})
+    return {row[0]: (row[1], row[2]) for row in cursor.fetchall() if row[1] or row[2]}
+
+def compare_job(conn, folder, char, ref_ts, comp_sel, timing=None):
+    own_timing = timing is None
+    if own_timing:
+        timing = Timing("compare")
+    new_ts = None
+    if comp_sel == "Latest":
+        with timing.stage("latest"):
+            new_ts = load_latest_if_new(folder, conn, char)
+            if new_ts:
+                comp_ts = new_ts
+            else:
+                comp_ts = get_latest_timestamp(conn, char)
+    else:
+        comp_ts = comp_sel
+
+    changes, item_meta, totals = {}, {}, {}
+    if ref_ts and comp_ts:
+        with timing.stage("diff") as stage:
+            changes, item_meta, totals = get_comparison(conn, char, ref_ts, comp_ts)
+            stage["rows"] = len(changes)
+    if own_timing:
+        timing.finish()
+    return new_ts, comp_ts, changes, item_meta, totals
+
+def get_comparison(conn, char, ref_ts, comp_ts):
+    # (changes, item_meta, totals) between two stored snapshots; callers must not modify them
+    def load():
+        ref_id = get_snapshot_id(conn, char, ref_ts)
+        comp_id = get_snapshot_id(conn, char, comp_ts)
+        changes = {}
+        item_meta = {}
+        for name, delta, rarity, value in diff_snapshot_ids(conn, ref_id, comp_id, stream=True):
+            changes[name] = delta
+            item_meta[name] = (rarity, value)
+        return changes, item_meta, totals_change(conn, ref_id, comp_id)
+    return snapshot_cache.get(("diff", char, ref_ts, comp_ts), load)
+
+def get_summary(char, ref_ts, comp_ts, changes, item_meta):
+    # summarize_changes() for the comparison get_comparison() returned for the same key
+    return snapshot_cache.get(("summary", char, ref_ts, comp_ts), lambda: summarize_changes(changes, item_meta))
+
+def closest_snapshots(conn, epoch):
+    # {character: (snapshot_id, timestamp)} for each character's snapshot nearest epoch; ties go to the earlier one
+    closest = {}
+    for char in get_characters(conn):
+        found = snapshot_index.closest(conn, char, epoch)
+        if found:
+            closest[char] = found
+    return closest
+
+def batch_compare(conn, start_epoch, end_epoch):
+    # Diff every character between its snapshots closest to the two times, plus the
+    # account-wide total of all those diffs. Uses NumPy when it is installed.
+    refs = closest_snapshots(conn, start_epoch)
+    comps = closest_snapshots(conn, end_epoch)
+    pairs = [(char, refs[char], comps[char]) for char in refs if char in comps]
+    if np is not None:
+        return batch_compare_arrays(conn, pairs)
+
+    characters = []
+    account = {}
+    account_meta = {}
+    for char, (ref_id, ref_ts), (comp_id, comp_ts) in pairs:
+        changes = {}
+        item_meta = {}
+        for name, delta, rarity, value in diff_snapshot_ids(conn, ref_id, comp_id, stream=True):
+            changes[name] = delta
+            item_meta[name] = (rarity, value)
+            account[name] = account.get(name, 0) + delta
+        account_meta.update(item_meta)
+        characters.append({"character": char, "ref": ref_ts, "comp": comp_ts,
+                           "summary": summarize_changes(changes, item_meta)})
+    account = {name: delta for name, delta in account.items() if delta != 0}
+    return {"account": summarize_changes(account, account_meta), "characters": characters}
+
+def batch_compare_arrays(conn, pairs):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name, rarity, value FROM items")
+    rows = cursor.fetchall()
+    size = max((row[0] for row in rows), default=0) + 1
+    names = [None] * size
+    rarity_names = [None]
+    rarity_codes = {}
+    rarity = np.zeros(size, dtype=np.int64)
+    value = np.zeros(size, dtype=np.int64)
+    has_value = np.zeros(size, dtype=bool)
+    tracked = np.zeros(size, dtype=bool)
+    for item_id, name, item_rarity, item_value in rows:
+        names[item_id] = name
+        if item_rarity:
+            if item_rarity not in rarity_codes:
+                rarity_codes[item_rarity] = len(rarity_names)
+                rarity_names.append(item_rarity)
+            rarity[item_id] = rarity_codes[item_rarity]
+        if item_value is not None:
+            value[item_id] = item_value
+            has_value[item_id] = True
+        lower = name.lower()
+        tracked[item_id] = "phlogiston" in lower or "prism" in lower
+    arrays = (names, rarity_names, rarity, value, has_value, tracked)
+
+    # A diff is the sum of the stored consecutive deltas between the two snapshots,
+    # so SQLite only hands back the items that changed
+    cursor.execute('''
+        WITH pairs AS (
+            SELECT p.key AS idx, r.character_id, MIN(r.epoch, c.epoch) AS low, MAX(r.epoch, c.epoch) AS high,
+                   CASE WHEN c.epoch >= r.epoch THEN 1 ELSE -1 END AS sign
+            FROM json_each(?) p
+            JOIN snapshots r ON r.id = json_extract(p.value, '$[0]')
+            JOIN snapshots c ON c.id = json_extract(p.value, '$[1]')
+        )
+        SELECT p.idx, d.item_id, p.sign * SUM(d.delta) FROM pairs p
+        JOIN snapshots s ON s.character_id = p.character_id AND s.epoch > p.low AND s.epoch <= p.high
+        JOIN snapshot_deltas d ON d.snapshot_id = s.id
+        GROUP BY p.idx, d.item_id HAVING SUM(d.delta) != 0
+    ''', (json.dumps([[ref[0], comp[0]] for _, ref, comp in pairs]),))
+    diffs = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+    diffs = diffs[np.argsort(diffs[:, 0], kind="stable")]
+    starts = np.searchsorted(diffs[:, 0], np.arange(len(pairs)))
+    ends = np.searchsorted(diffs[:, 0], np.arange(len(pairs)), side="right")
+
+    characters = []
+    for (char, (_, ref_ts), (_, comp_ts)), start, end in zip(pairs, starts, ends):
+        block = diffs[start:end]
+        characters.append({"character": char, "ref": ref_ts, "comp": comp_ts,
+                           "summary": summarize_arrays(block[:, 1], block[:, 2], arrays)})
+    account = np.bincount(diffs[:, 1], weights=diffs[:, 2], minlength=size).astype(np.int64)
+    changed = np.flatnonzero(account)
+    return {"account": summarize_arrays(changed, account[changed], arrays), "characters": characters}
+
+def summarize_arrays(item_ids, delta, arrays):
+    # summarize_changes() for parallel arrays of item ids and non-zero deltas
+    names, rarity_names, rarity, value, has_value, tracked = arrays
+    rarity = rarity[item_ids]
+    value = value[item_ids]
+    has_value = has_value[item_ids]
+    gained = delta > 0
+    total_gained = int(delta[gained].sum())
+    total_lost = int(-delta[delta < 0].sum())
+
+    rarity_gained = gained & (rarity > 0)
+    counts = np.bincount(rarity[rarity_gained], weights=delta[rarity_gained], minlength=len(rarity_names))
+    rarity_valued = rarity_gained & has_value
+    values = np.bincount(rarity[rarity_valued], weights=(delta * value)[rarity_valued], minlength=len(rarity_names))
+    valued = np.bincount(rarity[rarity_valued], minlength=len(rarity_names))
+    rarity_counts = {rarity_names[code]: int(counts[code]) for code in range(1, len(rarity_names)) if counts[code]}
+    rarity_values = {rarity_names[code]: int(values[code]) for code in range(1, len(rarity_names)) if valued[code]}
+
+    misc = gained & (rarity == 0) & has_value
+    over = misc & (value >= 1000)
+    under = misc & (value < 1000)
+    misc_over_1k_value = int((delta * value)[over].sum())
+    misc_under_1k_value = int((delta * value)[under].sum())
+
+    pp = tracked[item_ids]
+    phlogiston_prism_items = {names[item_id]: int(d) for item_id, d in zip(item_ids[pp], delta[pp])}
+
+    return {
+        "total_gained": total_gained,
+        "total_lost": total_lost,
+        "phlogiston_prism_items": phlogiston_prism_items,
+        "rarity_counts": rarity_counts,
+        "rarity_values": rarity_values,
+        "misc_over_1k": int(delta[over].sum()),
+        "misc_under_1k": int(delta[under].sum()),
+        "misc_over_1k_value": misc_over_1k_value,
+        "misc_under_1k_value": misc_under_1k_value,
+        "total_category_value": sum(rarity_values.values()) + misc_over_1k_value + misc_under_1k_value,
+    }
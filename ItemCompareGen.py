@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+RARITIES = [("Uncommon", 50), ("Rare", 30), ("Epic", 15), ("Legendary", 5)]
+GEAR_WORDS = ["Helm", "Chest", "Gloves", "Boots", "Pants", "Ring", "Necklace", "Sword", "Staff", "Shield", "Bow", "Belt"]
+GEAR_PREFIXES = ["Ancient", "Cursed", "Fine", "Glowing", "Masterwork", "Rugged", "Shimmering", "Sturdy", "Twisted"]
+MISC_WORDS = ["Ore", "Hide", "Bone", "Crystal", "Fiber", "Herb", "Potion", "Scroll", "Seed", "Gem", "Meat", "Essence"]
+MISC_PREFIXES = ["Amber", "Bitter", "Copper", "Dark", "Dire", "Golden", "Iron", "Moon", "Salty", "Silver", "Wild"]
+SPECIAL_ITEMS = ["Phlogiston", "Fine Phlogiston", "Perfect Phlogiston", "Prism of Fire", "Prism of Ice", "Prism of Life"]
+VAULTS = ["Inventory", "Serbule Storage", "Eltibule Storage", "Saddlebag", "Council Vault"]
+
+def make_catalog(rng, size):
+    # [(name, rarity, value)]; about a third is gear with a rarity, the rest misc
+    # items whose values spread across the 1k split the Summary tab uses
+    catalog = []
+    for name in SPECIAL_ITEMS:
+        catalog.append((name, None, rng.choice([200, 600, 2500])))
+    while len(catalog) < size:
+        n = len(catalog)
+        if rng.random() < 0.35:
+            rarity = rng.choices([r for r, _ in RARITIES], [w for _, w in RARITIES])[0]
+            name = f"{rng.choice(GEAR_PREFIXES)} {rng.choice(GEAR_WORDS)} #{n}"
+            value = int(rng.lognormvariate(7, 1.2))
+        else:
+            rarity = None
+            name = f"{rng.choice(MISC_PREFIXES)} {rng.choice(MISC_WORDS)} #{n}"
+            value = None if rng.random() < 0.05 else max(1, int(rng.lognormvariate(5, 1.8)))
+        catalog.append((name, rarity, value))
+    return catalog
+
+def report_items(inventory, catalog, rng):
+    # Misc items are split into stacks of up to 100 across vaults, as the game exports them
+    items = []
+    for index, qty in inventory.items():
+        name, rarity, value = catalog[index]
+        while qty > 0:
+            stack = qty if rarity else min(qty, rng.randint(1, 100))
+            item = {"TypeID": 1000 + index, "Name": name, "StackSize": stack,
+                    "StorageVault": rng.choice(VAULTS)}
+            if rarity:
+                item["Rarity"] = rarity
+            if value is not None:
+                item["Value"] = value
+            items.append(item)
+            qty -= stack
+    return items
+
+def generate_reports(folder, characters=3, snapshots=50, items=3000, held=0.4, churn=0.02,
+                     unchanged=0.1, seed=1, start=datetime(2024, 1, 1)):
+    # Writes <Character>_items_<YYYY-MM-DD-HH-MM-SSZ>.json reports for each character,
+    # each snapshot changing about churn of the items held; unchanged of them are
+    # re-exports with nothing changed. Returns the paths written.
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    catalog = make_catalog(rng, items)
+    paths = []
+    for c in range(characters):
+        character = f"Char{c}"
+        held_items = rng.sample(range(len(catalog)), max(1, int(len(catalog) * held)))
+        inventory = {index: 1 if catalog[index][1] else rng.randint(1, 500) for index in held_items}
+        when = start + timedelta(minutes=rng.randint(0, 600))
+        for s in range(snapshots):
+            when += timedelta(seconds=rng.randint(30 * 60, 48 * 3600))
+            if s and rng.random() >= unchanged:
+                for _ in range(max(1, int(len(inventory) * churn))):
+                    index = rng.randrange(len(catalog))
+                    qty = inventory.get(index, 0) + rng.randint(-20, 30)
+                    if catalog[index][1]:
+                        qty = min(qty, 1)
+                    if qty > 0:
+                        inventory[index] = qty
+                    else:
+                        inventory.pop(index, None)
+            report = {
+                "Character": character,
+                "ServerName": "Benchmark",
+                "Timestamp": when.strftime("%Y-%m-%d %H:%M:%SZ"),
+                "Report": "Storage",
+                "ReportVersion": 1,
+                "Items": report_items(inventory, catalog, rng),
+            }
+            path = os.path.join(folder, f"{character}_items_{when.strftime('%Y-%m-%d-%H-%M-%SZ')}.json")
+            with open(path, "w") as f:
+                json.dump(report, f)
+            paths.append(path)
+    return paths
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Write synthetic Project Gorgon item reports")
+    parser.add_argument("folder")
+    parser.add_argument("--characters", type=int, default=3)
+    parser.add_argument("--snapshots", type=int, default=50, help="reports per character")
+    parser.add_argument("--items", type=int, default=3000, help="distinct items in the game")
+    parser.add_argument("--held", type=float, default=0.4, help="fraction of items each character holds")
+    parser.add_argument("--churn", type=float, default=0.02, help="fraction of held items changed per report")
+    parser.add_argument("--unchanged", type=float, default=0.1, help="fraction of reports with no changes")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    paths = generate_reports(args.folder, args.characters, args.snapshots, args.items,
+                             args.held, args.churn, args.unchanged, args.seed)
+    print(f"Wrote {len(paths)} reports to {args.folder}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())